@@ -0,0 +1,166 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from db import get_period_columns
+from report_cache import cached
+
+# Columnar aggregation for reports and the web dashboard.
+# A Ledger holds one period as NumPy arrays: amounts as int64 minor units
+# (paise/cents), so sums are exact, and strings dictionary-encoded as int32
+# codes into a label list. Group-bys are one np.add.at over those arrays
+# instead of a Python loop per row.
+
+GROUP_KEYS = ('category', 'user', 'type', 'day', 'week', 'month')
+TIME_KEYS = ('day', 'week', 'month')
+
+UNCATEGORIZED = 'Uncategorized'
+
+
+# Function to turn integer minor units back into an exact Decimal amount
+def to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+# Function to dictionary-encode a column of `count` values: (int32 codes, labels)
+def _encode(values, count):
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=count)
+    return codes, list(index)
+
+
+class Ledger:
+    def __init__(self, cents, counts, type_codes, types, category_codes, categories, user_codes, users, days):
+        self.cents = cents                # int64 amount in minor units
+        self.counts = counts              # int64 transactions per row (1 for raw rows)
+        self.type_codes = type_codes      # int32 codes into self.types
+        self.types = types
+        self.category_codes = category_codes
+        self.categories = categories
+        self.user_codes = user_codes
+        self.users = users
+        self.days = days                  # datetime64[D]
+
+    def __len__(self):
+        return len(self.cents)
+
+    # Function to build a Ledger from (cents, count, type, category, user, day)
+    # rows, the format of db.get_period_columns
+    @classmethod
+    def from_rows(cls, rows):
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, empty.astype(np.int32), [], empty.astype(np.int32), [],
+                       empty.astype(np.int32), [], empty.astype('datetime64[D]'))
+        # One pass per column straight into arrays; unpacking with zip(*rows)
+        # would build a million-element argument tuple and is far slower
+        n = len(rows)
+        type_codes, type_labels = _encode((r[2] for r in rows), n)
+        category_codes, category_labels = _encode((r[3] for r in rows), n)
+        user_codes, user_labels = _encode((r[4] for r in rows), n)
+        # Few distinct days: convert each once, then expand by code
+        day_codes, day_labels = _encode((r[5] for r in rows), n)
+        return cls(
+            np.fromiter((r[0] for r in rows), dtype=np.int64, count=n),
+            np.fromiter((r[1] for r in rows), dtype=np.int64, count=n),
+            type_codes, type_labels,
+            category_codes, category_labels,
+            user_codes, user_labels,
+            np.array(day_labels, dtype='datetime64[D]')[day_codes],
+        )
+
+    # Function to keep only the rows matching the given type/user/category
+    def filter(self, transaction_type=None, user=None, category=None):
+        mask = np.ones(len(self), dtype=bool)
+        for value, codes, labels in (
+            (transaction_type, self.type_codes, self.types),
+            (user, self.user_codes, self.users),
+            (category, self.category_codes, self.categories),
+        ):
+            if value is not None:
+                mask &= codes == (labels.index(value) if value in labels else -1)
+        return Ledger(
+            self.cents[mask], self.counts[mask],
+            self.type_codes[mask], self.types,
+            self.category_codes[mask], self.categories,
+            self.user_codes[mask], self.users,
+            self.days[mask],
+        )
+
+    # Total in minor units
+    def total(self):
+        return int(self.cents.sum())
+
+    def transaction_count(self):
+        return int(self.counts.sum())
+
+    # Function to get the int64 group key for each row and a label per key
+    def _keys(self, key):
+        if key == 'day':
+            return self.days.astype(np.int64), lambda k: _day(k)
+        if key == 'week':
+            # Day 0 (1970-01-01) was a Thursday; shift so weeks start on Monday
+            day_numbers = self.days.astype(np.int64)
+            return day_numbers - (day_numbers + 3) % 7, lambda k: _day(k)
+        if key == 'month':
+            return self.days.astype('datetime64[M]').astype(np.int64), lambda k: _month(k)
+        codes, labels = {
+            'category': (self.category_codes, self.categories),
+            'type': (self.type_codes, self.types),
+            'user': (self.user_codes, self.users),
+        }[key]
+        return codes.astype(np.int64), lambda k: labels[k] or UNCATEGORIZED
+
+    # Function to group by one of GROUP_KEYS.
+    # Returns [(label, total in minor units, transaction count), ...], in time
+    # order for day/week/month and largest total first otherwise.
+    def group_by(self, key):
+        if key not in GROUP_KEYS:
+            raise ValueError(f"Unknown group key {key!r}; expected one of {', '.join(GROUP_KEYS)}")
+        if not len(self):
+            return []
+        keys, label = self._keys(key)
+        # Keys are dense (codes, or days/weeks/months within the period), so
+        # they index a small accumulator directly; no sort needed
+        offset = int(keys.min())
+        slots = keys - offset
+        size = int(slots.max()) + 1
+        totals = np.zeros(size, dtype=np.int64)
+        counts = np.zeros(size, dtype=np.int64)
+        np.add.at(totals, slots, self.cents)
+        np.add.at(counts, slots, self.counts)
+
+        present = np.flatnonzero(counts)
+        if key not in TIME_KEYS:
+            present = present[np.argsort(-totals[present], kind='stable')]
+        return [(label(int(i) + offset), int(totals[i]), int(counts[i])) for i in present]
+
+    # Function to get the cumulative total at the end of each day/week/month:
+    # [(label, running total in minor units), ...]
+    def running_totals(self, key='day'):
+        if key not in TIME_KEYS:
+            raise ValueError(f"Running totals need a time key ({', '.join(TIME_KEYS)})")
+        groups = self.group_by(key)
+        running = np.cumsum(np.array([total for _, total, _ in groups], dtype=np.int64))
+        return [(label, int(value)) for (label, _, _), value in zip(groups, running)]
+
+
+def _day(day_number):
+    return np.datetime64(day_number, 'D').astype(date)
+
+
+def _month(month_number):
+    return np.datetime64(month_number, 'M').astype('datetime64[D]').astype(date)
+
+
+# Function to load a period into a Ledger. rollup=True reads the daily_totals
+# rollup (one row per user/day/type/category), which is enough for every
+# group-by here and much smaller than the raw transactions. Ledgers are kept
+# in the report cache and dropped when a save touches their period, so treat
+# them as read-only (filter() returns a new Ledger).
+def load_ledger(start_date, end_date, username=None, rollup=True):
+    return cached(
+        (username, start_date, end_date, 'ledger:rollup' if rollup else 'ledger:raw'),
+        lambda: Ledger.from_rows(get_period_columns(start_date, end_date, username, rollup))
+    )
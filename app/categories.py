@@ -0,0 +1,205 @@
+import asyncio
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from db import load_categories, replace_categories, run_db
+from quick_entry import QuickEntryParser
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_TYPES = ('expense', 'income')
+# Category names are shown on buttons (characters) and sent back as
+# callback_data, which Telegram caps at 64 bytes (UTF-8)
+CATEGORY_NAME_MAX = 32
+CALLBACK_DATA_MAX_BYTES = 64
+# Names appear in Markdown replies and digests, so Markdown markup is refused
+CATEGORY_NAME_FORBIDDEN = '_*`['
+
+
+# Per-user and per-group category lists. The owner is the chat id: a user in
+# a private chat, or a group (negative id) whose members share one list.
+# Owners who never edited their categories get the defaults.
+#
+# Every list is loaded once at startup and the bot is the only writer, so
+# reads (keyboards, quick-entry parsing) never touch the database. The
+# InlineKeyboardMarkup and QuickEntryParser for an owner are built on first
+# use and kept until that owner edits their categories.
+class CategoryCache:
+    def __init__(self, expense_categories=(), income_categories=()):
+        self._defaults = {}
+        self._lists = {}       # owner_id -> {type: [(name, archived), ...]} in display order
+        self._keyboards = {}   # (owner_id or None, type) -> InlineKeyboardMarkup
+        self._parsers = {}     # owner_id or None -> QuickEntryParser
+        self._lock = asyncio.Lock()
+        self.set_defaults(expense_categories, income_categories)
+
+    # Function to set the lists used by owners without their own categories
+    def set_defaults(self, expense_categories, income_categories):
+        self._defaults = {
+            'expense': [(name, False) for name in expense_categories],
+            'income': [(name, False) for name in income_categories],
+        }
+        self._forget(None)
+
+    # Function to (re)load every custom list from the database. Blocking; run it with run_db.
+    def load(self):
+        lists = {}
+        for owner_id, transaction_type, name, _, archived in load_categories():
+            owner = lists.setdefault(owner_id, {t: [] for t in CATEGORY_TYPES})
+            owner.setdefault(transaction_type, []).append((name, bool(archived)))
+        self._lists = lists
+        self._keyboards.clear()
+        self._parsers.clear()
+        logger.info("Loaded categories for %s chats", len(lists))
+
+    def _key(self, owner_id):
+        return owner_id if owner_id in self._lists else None
+
+    def _forget(self, key):
+        for transaction_type in CATEGORY_TYPES:
+            self._keyboards.pop((key, transaction_type), None)
+        self._parsers.pop(key, None)
+
+    # Function to get all of an owner's categories as [(name, archived)]
+    def entries(self, owner_id, transaction_type='expense'):
+        return list(self._lists.get(owner_id, self._defaults)[transaction_type])
+
+    # Function to get the names offered for new transactions (archived ones left out)
+    def categories(self, owner_id, transaction_type='expense'):
+        return [name for name, archived in self._lists.get(owner_id, self._defaults)[transaction_type] if not archived]
+
+    def keyboard(self, owner_id, transaction_type='expense'):
+        key = (self._key(owner_id), transaction_type)
+        markup = self._keyboards.get(key)
+        if markup is None:
+            markup = self._keyboards[key] = InlineKeyboardMarkup(
+                [[InlineKeyboardButton(name, callback_data=name)] for name in self.categories(owner_id, transaction_type)]
+            )
+        return markup
+
+    def parser(self, owner_id):
+        key = self._key(owner_id)
+        parser = self._parsers.get(key)
+        if parser is None:
+            parser = self._parsers[key] = QuickEntryParser(
+                self.categories(owner_id, 'expense'), self.categories(owner_id, 'income')
+            )
+        return parser
+
+    # Function to apply `change(lists)` to a copy of an owner's lists, store
+    # the result and then swap it into the cache
+    async def _edit(self, owner_id, change):
+        async with self._lock:
+            lists = {t: list(entries) for t, entries in self._lists.get(owner_id, self._defaults).items()}
+            result = change(lists)
+            rows = [(t, name, position, archived)
+                    for t in CATEGORY_TYPES for position, (name, archived) in enumerate(lists[t], start=1)]
+            await run_db(replace_categories, owner_id, rows)
+            self._lists[owner_id] = lists
+            self._forget(owner_id)
+            return result
+
+    @staticmethod
+    def _find(lists, name, transaction_type=None):
+        for t in (transaction_type,) if transaction_type else CATEGORY_TYPES:
+            for index, (existing, archived) in enumerate(lists[t]):
+                if existing.lower() == name.lower():
+                    return t, index
+        raise ValueError(f"No category named {name!r}.")
+
+    # Function to add a category (or bring back an archived one with that name)
+    async def add(self, owner_id, name, transaction_type='expense'):
+        name = ' '.join(name.split())
+        if not name or len(name) > CATEGORY_NAME_MAX:
+            raise ValueError(f"Category names must be 1-{CATEGORY_NAME_MAX} characters.")
+        if len(name.encode('utf-8')) > CALLBACK_DATA_MAX_BYTES:
+            raise ValueError("That name is too long for a button; please use a shorter one.")
+        if any(char in name for char in CATEGORY_NAME_FORBIDDEN):
+            raise ValueError(f"Category names cannot contain any of {' '.join(CATEGORY_NAME_FORBIDDEN)}")
+
+        def change(lists):
+            try:
+                t, index = self._find(lists, name, transaction_type)
+            except ValueError:
+                lists[transaction_type].append((name, False))
+                return name
+            existing, archived = lists[t][index]
+            if not archived:
+                raise ValueError(f"{existing!r} already exists.")
+            lists[t][index] = (existing, False)
+            return existing
+        return await self._edit(owner_id, change)
+
+    # Function to hide a category from new transactions (or show it again);
+    # transactions already saved keep their category
+    async def archive(self, owner_id, name, archived=True):
+        def change(lists):
+            t, index = self._find(lists, name)
+            existing = lists[t][index][0]
+            if archived and len([n for n, a in lists[t] if not a]) == 1:
+                raise ValueError(f"{existing!r} is your last {t} category.")
+            lists[t][index] = (existing, archived)
+            return existing
+        return await self._edit(owner_id, change)
+
+    # Function to move a category to a 1-based position among the shown ones
+    async def move(self, owner_id, name, position):
+        def change(lists):
+            t, index = self._find(lists, name)
+            entry = lists[t].pop(index)
+            shown = [i for i, (_, archived) in enumerate(lists[t]) if not archived]
+            target = shown[position - 1] if 0 < position <= len(shown) else len(lists[t])
+            lists[t].insert(target, entry)
+            return entry[0]
+        return await self._edit(owner_id, change)
+
+
+category_cache = CategoryCache()
+
+
+def _format_lists(owner_id):
+    lines = []
+    for transaction_type in CATEGORY_TYPES:
+        lines.append(f"{transaction_type.title()}:")
+        shown = 0
+        for name, archived in category_cache.entries(owner_id, transaction_type):
+            if archived:
+                lines.append(f"   – {name} (archived)")
+            else:
+                shown += 1
+                lines.append(f"{shown:>2}. {name}")
+    return "\n".join(lines)
+
+
+# /categories [add <name> [income] | archive <name> | restore <name> | move <name> <position>]
+async def categories_command(update, context):
+    args = context.args or []
+    owner_id = update.effective_chat.id
+    usage = ("Usage:\n/categories add <name> [income]\n/categories archive <name>\n"
+             "/categories restore <name>\n/categories move <name> <position>")
+    if not args:
+        await update.message.reply_text(f"{_format_lists(owner_id)}\n\n{usage}")
+        return
+
+    action, rest = args[0].lower(), args[1:]
+    try:
+        if action == 'add' and rest:
+            transaction_type = 'expense'
+            if len(rest) > 1 and rest[-1].lower() in CATEGORY_TYPES:
+                transaction_type = rest.pop().lower()
+            name = await category_cache.add(owner_id, ' '.join(rest), transaction_type)
+            reply = f"✅ Added {name}."
+        elif action in ('archive', 'restore') and rest:
+            name = await category_cache.archive(owner_id, ' '.join(rest), archived=action == 'archive')
+            reply = f"✅ {'Archived' if action == 'archive' else 'Restored'} {name}."
+        elif action == 'move' and len(rest) > 1 and rest[-1].isdigit():
+            name = await category_cache.move(owner_id, ' '.join(rest[:-1]), int(rest[-1]))
+            reply = f"✅ Moved {name}."
+        else:
+            await update.message.reply_text(usage)
+            return
+    except ValueError as exc:
+        await update.message.reply_text(f"❌ {exc}")
+        return
+    await update.message.reply_text(f"{reply}\n\n{_format_lists(owner_id)}")
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Processes rendering charts; matplotlib is only imported inside them
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))
+# Charts remembered (Telegram file_id once uploaded, PNG bytes until then)
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '256'))
+# Above this many categories a pie is unreadable, so a bar chart is drawn
+PIE_MAX_SLICES = 6
+
+# 'category': labels are category names; 'trend': labels are ISO dates
+CHART_KINDS = ('category', 'trend')
+
+
+# Function to render a chart to PNG bytes. Runs in a worker process.
+def render_chart(kind, title, labels, values):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
+    try:
+        if kind == 'category' and len(labels) <= PIE_MAX_SLICES:
+            ax.pie(values, labels=labels, autopct='%1.0f%%', startangle=90, counterclock=False)
+            ax.axis('equal')
+        elif kind == 'category':
+            positions = range(len(labels))
+            ax.barh(positions, values)
+            ax.set_yticks(positions, labels)
+            ax.invert_yaxis()  # Largest first
+            ax.set_xlabel('Amount')
+        else:
+            days = [date.fromisoformat(label) for label in labels]
+            ax.plot(days, values, marker='o' if len(days) <= 31 else None)
+            ax.set_ylabel('Amount')
+            ax.grid(alpha=0.3)
+            fig.autofmt_xdate()
+        ax.set_title(title)
+        out = io.BytesIO()
+        fig.savefig(out, format='png', bbox_inches='tight')
+        return out.getvalue()
+    finally:
+        plt.close(fig)
+
+
+# Renders charts in a process pool and remembers them by a hash of their
+# kind, title (which carries the period) and data. Identical requests get the
+# cached PNG, and once it has been sent, Telegram's file_id, so the same chart
+# is neither re-rendered nor re-uploaded. Concurrent requests for the same
+# chart share one render.
+class ChartRenderer:
+    def __init__(self, workers=CHART_WORKERS, cache_size=CHART_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # key -> file_id (str) or PNG (bytes)
+        self._rendering = {}          # key -> Future of PNG bytes
+        self._pool = None
+        self.renders = 0
+
+    @staticmethod
+    def chart_key(kind, title, labels, values):
+        return hashlib.sha256(repr((kind, title, list(labels), list(values))).encode()).hexdigest()
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and DB threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _remember(self, key, photo):
+        self._cache[key] = photo
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # Function to get a chart as (key, photo) where photo is a Telegram
+    # file_id if it was uploaded before, else PNG bytes
+    async def get(self, kind, title, labels, values):
+        if kind not in CHART_KINDS:
+            raise ValueError(f"Unknown chart kind {kind!r}")
+        labels, values = [str(label) for label in labels], [float(value) for value in values]
+        key = self.chart_key(kind, title, labels, values)
+
+        photo = self._cache.get(key)
+        if photo is not None:
+            self._cache.move_to_end(key)
+            return key, photo
+
+        future = self._rendering.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor(), render_chart, kind, title, labels, values)
+            self._rendering[key] = future
+            try:
+                png = await future
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool next time
+                self.shutdown()
+                raise
+            finally:
+                self._rendering.pop(key, None)
+            self.renders += 1
+            if key not in self._cache:  # An upload may have finished meanwhile
+                self._remember(key, png)
+            return key, png
+        return key, await future
+
+    # Function to store Telegram's file_id after the PNG was sent once
+    def remember_upload(self, key, file_id):
+        self._remember(key, file_id)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+chart_renderer = ChartRenderer()
@@ -0,0 +1,216 @@
+import csv
+import difflib
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+
+# Rows per save_many_to_db call (one database transaction each)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '5000'))
+# Row errors kept for the final report; the rest are only counted
+IMPORT_MAX_ERRORS_SHOWN = 10
+
+# Same rule as the amount() handler: digits with at most two decimals
+AMOUNT_RE = re.compile(r'^\d+(\.\d{1,2})?$')
+# Largest amount the DECIMAL(10,2) amount column holds
+MAX_AMOUNT = Decimal('99999999.99')
+# Currency symbols, thousands separators and spaces removed before validation
+AMOUNT_NOISE_RE = re.compile(r'[,\s₹$€£]|INR|Rs\.?', re.IGNORECASE)
+
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y',
+    '%d/%m/%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y',
+)
+
+DELIMITERS = (',', ';', '\t', '|')
+
+# Header names accepted for each field (lower case); the first match wins
+COLUMN_ALIASES = {
+    'date': ('date', 'timestamp', 'transaction date', 'txn date', 'value date', 'posting date'),
+    'amount': ('amount', 'amt', 'transaction amount', 'value'),
+    'debit': ('debit', 'withdrawal', 'withdrawal amt.', 'withdrawal amount', 'debit amount', 'dr'),
+    'credit': ('credit', 'deposit', 'deposit amt.', 'deposit amount', 'credit amount', 'cr'),
+    'type': ('type', 'transaction type', 'dr/cr', 'cr/dr'),
+    'category': ('category', 'categories'),
+    'description': ('description', 'narration', 'details', 'particulars', 'remarks', 'memo'),
+}
+
+
+# The file cannot be imported at all (e.g. no date or amount column)
+class CsvImportError(ValueError):
+    pass
+
+
+# Function to map a header row to {field: column index}
+def map_columns(header):
+    names = [h.strip().lower() for h in header]
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if 'date' not in columns:
+        raise CsvImportError("No date column found (expected e.g. 'date' or 'transaction date').")
+    if 'amount' not in columns and not ('debit' in columns or 'credit' in columns):
+        raise CsvImportError("No amount column found (expected 'amount' or 'debit'/'credit').")
+    return columns
+
+
+# Function to parse a date cell; returns (datetime, format). Files use one
+# format throughout, so callers pass the last format that worked as a hint.
+def parse_date(text, hint=None):
+    text = text.strip()
+    if hint is not None:
+        try:
+            return datetime.strptime(text, hint), hint
+        except ValueError:
+            pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt), fmt
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {text!r}")
+
+
+# Function to validate an amount cell; returns (amount string, is_negative) or None if empty
+def parse_amount(text):
+    text = AMOUNT_NOISE_RE.sub('', text or '')
+    if not text:
+        return None
+    negative = text.startswith('-') or (text.startswith('(') and text.endswith(')'))
+    text = text.strip('-()+')
+    if not AMOUNT_RE.match(text):
+        raise ValueError(f"invalid amount {text!r}")
+    if Decimal(text) > MAX_AMOUNT:
+        raise ValueError(f"amount {text} is over {MAX_AMOUNT:,}")
+    return text, negative
+
+
+# Maps free-text categories onto the bot's category lists: exact match
+# (ignoring case) first, then the closest name, otherwise 'Other'
+class CategoryMapper:
+    def __init__(self, expense_categories, income_categories):
+        self._lists = {'expense': list(expense_categories), 'income': list(income_categories)}
+        self._lower = {t: {c.lower(): c for c in cats} for t, cats in self._lists.items()}
+        self._memo = {}
+
+    def map(self, transaction_type, name):
+        key = (transaction_type, name.strip().lower())
+        mapped = self._memo.get(key)
+        if mapped is None:
+            lower = self._lower[transaction_type]
+            mapped = lower.get(key[1])
+            if mapped is None:
+                close = difflib.get_close_matches(key[1], lower, n=1, cutoff=0.8)
+                mapped = lower[close[0]] if close else 'Other'
+            self._memo[key] = mapped
+        return mapped
+
+
+# Streams a CSV file and yields batches of save_many_to_db rows. The file is
+# read one row at a time, so memory use depends on the batch size only.
+class CsvImporter:
+    def __init__(self, path, username, expense_categories, income_categories, batch_size=IMPORT_BATCH_SIZE):
+        self.path = path
+        self.username = username
+        self.batch_size = batch_size
+        self.categories = CategoryMapper(expense_categories, income_categories)
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []  # first IMPORT_MAX_ERRORS_SHOWN "line N: reason" messages
+        self.bytes_total = os.path.getsize(path)
+        self.bytes_read = 0
+        self._date_format = None
+
+    def _row(self, cells, columns):
+        def cell(field):
+            index = columns.get(field)
+            return cells[index].strip() if index is not None and index < len(cells) else ''
+
+        timestamp, self._date_format = parse_date(cell('date'), self._date_format)
+        transaction_type = None
+        if 'amount' in columns:
+            parsed = parse_amount(cell('amount'))
+            if parsed is None:
+                raise ValueError("empty amount")
+            amount, negative = parsed
+            if not float(amount):
+                raise ValueError("zero amount")
+            kind = cell('type').lower()
+            if kind in ('income', 'credit', 'cr', 'deposit'):
+                transaction_type = 'income'
+            elif kind in ('expense', 'debit', 'dr', 'withdrawal'):
+                transaction_type = 'expense'
+            elif not kind:
+                # No type given: a signed amount column, negative for money out
+                transaction_type = 'expense' if negative else 'income'
+            else:
+                raise ValueError(f"unknown type {kind!r}")
+        else:
+            debit, credit = parse_amount(cell('debit')), parse_amount(cell('credit'))
+            if debit and float(debit[0]):
+                amount, transaction_type = debit[0], 'expense'
+            elif credit and float(credit[0]):
+                amount, transaction_type = credit[0], 'income'
+            else:
+                raise ValueError("no debit or credit amount")
+
+        category = self.categories.map(transaction_type, cell('category'))
+        description = cell('description')[:255]
+        return (amount, transaction_type, category, description, self.username, timestamp)
+
+    # Counts characters read (close enough to bytes for progress reporting)
+    def _track_progress(self, lines):
+        for line in lines:
+            self.bytes_read += len(line)
+            yield line
+
+    # Function to find the header: bank statements often start with a few
+    # lines of account details, so it is the first line (within the first 30)
+    # that maps to date + amount columns with one of the usual delimiters
+    @staticmethod
+    def _find_header(f):
+        error = CsvImportError("The file is empty.")
+        for line_number, line in enumerate(f, start=1):
+            for delimiter in DELIMITERS:
+                cells = next(csv.reader([line], delimiter=delimiter), [])
+                if len(cells) < 2:
+                    continue
+                try:
+                    return line_number, delimiter, map_columns(cells)
+                except CsvImportError as exc:
+                    error = exc
+            if line_number >= 30:
+                break
+        raise error
+
+    def batches(self):
+        with open(self.path, newline='', encoding='utf-8-sig', errors='replace') as f:
+            header_line, delimiter, columns = self._find_header(f)
+            f.seek(0)
+            reader = csv.reader(self._track_progress(f), delimiter=delimiter)
+            for _ in range(header_line):
+                next(reader)
+
+            batch = []
+            for cells in reader:
+                if not any(c.strip() for c in cells):
+                    continue
+                try:
+                    batch.append(self._row(cells, columns))
+                except (ValueError, IndexError) as exc:
+                    self.skipped += 1
+                    if len(self.errors) < IMPORT_MAX_ERRORS_SHOWN:
+                        self.errors.append(f"line {reader.line_num}: {exc}")
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.imported += len(batch)
+                    yield batch
+                    batch = []
+            self.bytes_read = self.bytes_total
+            if batch:
+                self.imported += len(batch)
+                yield batch
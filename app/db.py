@@ -1,106 +1,304 @@
-import mysql.connector
+import asyncio
+import functools
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from metrics import timed_query
+from report_cache import cached, report_cache
+from storage import DB_POOL_SIZE, create_storage
 from datetime import datetime
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get the database password from environment variables
-DB_PASSWORD = os.getenv('DB_PASSWORD')
+logger = logging.getLogger(__name__)
+
+# Write-behind settings: when enabled, saves from the bot are queued and
+# inserted in batches once WRITE_BEHIND_BATCH_SIZE rows are waiting or
+# WRITE_BEHIND_WINDOW_MS has passed since the first queued row.
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '100'))
+WRITE_BEHIND_WINDOW_MS = int(os.getenv('WRITE_BEHIND_WINDOW_MS', '50'))
+
+# Startup schema check: attempts and initial delay (doubles per attempt)
+DB_BOOTSTRAP_RETRIES = int(os.getenv('DB_BOOTSTRAP_RETRIES', '8'))
+DB_BOOTSTRAP_BACKOFF = float(os.getenv('DB_BOOTSTRAP_BACKOFF', '0.5'))
+
+# Rows per page for paginated reports
+REPORT_PAGE_SIZE = int(os.getenv('REPORT_PAGE_SIZE', '20'))
+
+# Storage backend, chosen with DB_BACKEND (mariadb or sqlite)
+_storage = None
+_storage_lock = threading.Lock()
+
+# Function to get the shared storage backend (created on first use)
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+# Function to swap in a specific storage backend (benchmarks, local runs)
+def use_storage(storage):
+    global _storage
+    with _storage_lock:
+        if _storage is not None and _storage is not storage:
+            _storage.close()
+        _storage = storage
+    report_cache.clear()
+
+# Function to close the storage backend's connections on shutdown
+def close_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is not None:
+            _storage.close()
+            _storage = None
 
 def create_table_if_not_exists():
-    # Connect to MySQL/MariaDB
-    connection = mysql.connector.connect(
-        host=os.getenv('DB_HOST', 'localhost'),
-        user=os.getenv('DB_USER', 'root'),
-        password=os.getenv('DB_PASSWORD', ''),
-        database=os.getenv('DB_NAME', '')
-    )
-    cursor = connection.cursor()
-
-    # Create the transactions table if it doesn't exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            amount DECIMAL(10, 2) NOT NULL,
-            type ENUM('income', 'expense') NOT NULL,
-            category VARCHAR(50),
-            description TEXT,
-            user VARCHAR(50),
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    connection.commit()
-    #cursor.close()
-    #connection.close()
-
-    # Create the users table if it doesn't exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            userid VARCHAR(15),
-            mobile BIGINT,
-            otp VARCHAR(15),
-            otpexp TIMESTAMP NULL,
-            UNIQUE (mobile, userid)
-        );
-    """)
-    connection.commit()
-    cursor.close()
-    connection.close()
-
-# Call the function to ensure the table is created
-create_table_if_not_exists()
-
-# Function to get a connection to the MariaDB database
-def get_db_connection():
-    return mysql.connector.connect(
-        host="mariadb",  # Database service name in Docker Compose
-        user="root",
-        password=DB_PASSWORD,  # Use password from environment variables
-        database="finance_tracker"
-    )
+    get_storage().create_schema()
+
+# Function to check the schema against schema_version and migrate it if
+# needed, retrying with exponential backoff while the database is unreachable
+# (e.g. the DB container is still starting). Call once during startup.
+def bootstrap_schema(retries=DB_BOOTSTRAP_RETRIES, backoff=DB_BOOTSTRAP_BACKOFF):
+    delay = backoff
+    for attempt in range(1, retries + 1):
+        try:
+            migrated = get_storage().ensure_schema()
+            logger.info("Schema %s", "migrated" if migrated else "up to date")
+            return migrated
+        except Exception:
+            if attempt == retries:
+                raise
+            logger.warning("Schema check failed (attempt %s/%s), retrying in %.1fs", attempt, retries, delay, exc_info=True)
+            close_storage()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
 
 # Function to save data to the database
-def save_data_to_db(amount, transaction_type, category, description, username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = "INSERT INTO transactions (amount, type, category, description, user) VALUES (%s, %s, %s, %s, %s)"
-    cursor.execute(query, (amount, transaction_type, category, description, username))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-# Function to get Transactions
+def save_data_to_db(amount, transaction_type, category, description, username, timestamp=None):
+    save_many_to_db([(amount, transaction_type, category, description, username, timestamp or datetime.now())])
+
+# Function to save a batch of (amount, type, category, description, user, timestamp)
+# rows in one database transaction, then drop the cached reports they affect
+@timed_query('save_many_to_db')
+def save_many_to_db(rows):
+    if not rows:
+        return
+    for username, day in get_storage().save_many(rows):
+        report_cache.invalidate(username, day)
+
+# Function to get Transactions. Only cache misses reach the database, so
+# only they are timed (_transactions_by_period).
 def get_transactions_by_period(start_date, end_date):
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
+    return cached(
+        (None, start_date, end_date, 'transactions'),
+        lambda: _transactions_by_period(start_date, end_date)
     )
-    cursor = conn.cursor()
 
-    query = """
-        SELECT amount, type, category, user, timestamp, description
-        FROM transactions
-        WHERE DATE(timestamp) BETWEEN %s AND %s
-        ORDER BY timestamp ASC
-    """
-    cursor.execute(query, (start_date, end_date))
-    result = cursor.fetchall()
+@timed_query('get_transactions_by_period')
+def _transactions_by_period(start_date, end_date):
+    return get_storage().transactions_by_period(start_date, end_date)
+
+# Function to get one page of transactions after/before a (timestamp, id) cursor
+@timed_query('get_transactions_page')
+def get_transactions_page(start_date, end_date, after=None, before=None, page_size=REPORT_PAGE_SIZE, username=None):
+    return get_storage().transactions_page(start_date, end_date, after, before, page_size, username)
+
+# Function to get the transactions data version (changes on every insert), for HTTP ETags
+def get_data_version():
+    return get_storage().data_version()
+
+# Function to stream a user's transactions in chunks (see Storage.iter_transactions).
+# Holds a connection until the generator is exhausted or closed.
+def iter_transactions(username, start_date, end_date, fetch_size=1000):
+    return get_storage().iter_transactions(username, start_date, end_date, fetch_size)
+
+# Function to get per-category Decimal totals and the grand total for a period
+def get_category_totals(start_date, end_date, transaction_type=None):
+    return cached(
+        (None, start_date, end_date, f'category_totals:{transaction_type or "all"}'),
+        lambda: _category_totals(start_date, end_date, transaction_type)
+    )
+
+@timed_query('get_category_totals')
+def _category_totals(start_date, end_date, transaction_type):
+    return get_storage().category_totals(start_date, end_date, transaction_type)
+
+# Function to read a period as (cents, count, type, category, user, day) rows
+# for analytics.Ledger; rollup=True reads daily_totals instead of transactions
+@timed_query('get_period_columns')
+def get_period_columns(start_date, end_date, username=None, rollup=False):
+    return get_storage().period_columns(start_date, end_date, username, rollup)
+
+# Function to recompute (or, with verify=True, check) the daily_totals rollup
+@timed_query('rebuild_daily_totals')
+def rebuild_daily_totals(chunk_days=31, verify=False):
+    try:
+        return get_storage().rebuild_daily_totals(chunk_days, verify)
+    finally:
+        if not verify:
+            report_cache.clear()
+
+# Bot persistence state (see persistence.py)
+@timed_query('load_user_state')
+def load_user_state(user_id):
+    return get_storage().load_user_state(user_id)
+
+@timed_query('load_conversations')
+def load_conversations(name, since):
+    return get_storage().load_conversations(name, since)
+
+@timed_query('save_bot_state')
+def save_bot_state(user_rows, dropped_user_ids, conversation_rows):
+    get_storage().save_bot_state(user_rows, dropped_user_ids, conversation_rows)
+
+# Scheduled digests (see digests.py)
+def save_digest_subscription(chat_id, username, frequency, send_minute):
+    get_storage().save_digest_subscription(chat_id, username, frequency, send_minute)
 
-    cursor.close()
-    conn.close()
-    return result
+def delete_digest_subscription(chat_id):
+    return get_storage().delete_digest_subscription(chat_id)
+
+@timed_query('digest_subscriptions')
+def get_digest_subscriptions(first_minute=0, end_minute=24 * 60, chat_id=None):
+    return get_storage().digest_subscriptions(first_minute, end_minute, chat_id)
+
+# Function to total a period per user, type and category for a list of users
+@timed_query('get_user_totals')
+def get_user_totals(start_date, end_date, usernames):
+    return get_storage().user_totals(start_date, end_date, usernames)
+
+# User-defined categories (see categories.py)
+@timed_query('load_categories')
+def load_categories():
+    return get_storage().load_categories()
+
+@timed_query('replace_categories')
+def replace_categories(owner_id, rows):
+    get_storage().replace_categories(owner_id, rows)
 
 # Create admin user if not exists
+@timed_query('create_admin_account')
 def create_admin_account():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = "INSERT INTO users (userid, mobile, otp, otpexp) VALUES ('admin', '0', 'admin', NULL)"
-    cursor.execute(query)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    get_storage().create_admin_account()
+
+
+# Async API for the bot handlers.
+# Blocking queries run on a dedicated thread pool sized to the connection pool,
+# so the event loop keeps serving other users while a query is in flight.
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db')
+
+async def _run_in_executor(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args))
+
+# Returns once the row is committed, also in write-behind mode
+async def save_data_to_db_async(amount, transaction_type, category, description, username):
+    row = (amount, transaction_type, category, description, username, datetime.now())
+    if WRITE_BEHIND:
+        return await get_write_behind_queue().save(row)
+    return await _run_in_executor(save_many_to_db, [row])
+
+async def run_db(func, *args):
+    return await _run_in_executor(func, *args)
+
+async def get_transactions_by_period_async(start_date, end_date):
+    return await _run_in_executor(get_transactions_by_period, start_date, end_date)
+
+async def get_transactions_page_async(start_date, end_date, after=None, before=None, page_size=REPORT_PAGE_SIZE):
+    return await _run_in_executor(get_transactions_page, start_date, end_date, after, before, page_size)
+
+async def get_category_totals_async(start_date, end_date, transaction_type=None):
+    return await _run_in_executor(get_category_totals, start_date, end_date, transaction_type)
+
+
+# In-process queue for write-behind mode. Each save waits on a future that is
+# resolved after the batch containing its row has been committed, so callers
+# can still confirm the save to the user.
+class WriteBehindQueue:
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH_SIZE, window_ms=WRITE_BEHIND_WINDOW_MS):
+        self.batch_size = batch_size
+        self._window = window_ms / 1000
+        self._pending = []  # (row, future)
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def save(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        self._has_rows.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            self._has_rows.clear()
+            self._full.clear()
+            if not batch:
+                return
+            try:
+                await _run_in_executor(save_many_to_db, [row for row, _ in batch])
+            except Exception as exc:
+                logger.exception("Write-behind flush of %s rows failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await self._has_rows.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self._window)
+            except asyncio.TimeoutError:
+                pass
+            # Shielded so close() cancelling this task does not abandon a batch
+            # already handed to the executor; close() then waits for it on
+            # _flush_lock before flushing the rest.
+            await asyncio.shield(self.flush())
+
+
+_write_behind_queue = None
+
+def get_write_behind_queue():
+    global _write_behind_queue
+    if _write_behind_queue is None:
+        _write_behind_queue = WriteBehindQueue()
+    return _write_behind_queue
+
+# Function to flush queued writes and release connections; call on shutdown
+async def shutdown_db():
+    global _write_behind_queue
+    if _write_behind_queue is not None:
+        await _write_behind_queue.close()
+        _write_behind_queue = None
+    close_storage()
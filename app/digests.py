@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from telegram.error import Forbidden, TelegramError
+
+from analytics import UNCATEGORIZED, to_decimal
+from db import delete_digest_subscription, get_digest_subscriptions, get_user_totals, run_db, save_digest_subscription
+from outbound import BULK
+
+logger = logging.getLogger(__name__)
+
+# Send times are grouped into buckets of this many minutes; one job run sends
+# the bucket that just ended, so a digest arrives at most this late
+DIGEST_BUCKET_MINUTES = int(os.getenv('DIGEST_BUCKET_MINUTES', '15'))
+# Day weekly digests go out on (0 = Monday); they cover the 7 days before it
+DIGEST_WEEKDAY = int(os.getenv('DIGEST_WEEKDAY', '0'))
+# Expense categories listed in a digest
+DIGEST_TOP_CATEGORIES = int(os.getenv('DIGEST_TOP_CATEGORIES', '5'))
+
+DIGEST_FREQUENCIES = ('daily', 'weekly')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+_TIME_RE = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+
+
+# Function to parse "HH:MM" into minutes after midnight
+def parse_send_time(text):
+    match = _TIME_RE.match(text.strip())
+    if not match:
+        raise ValueError(f"Expected a time like 08:30, got {text!r}")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def format_send_time(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+# Function to get the period a digest sent on `send_date` covers:
+# yesterday for daily digests, the previous 7 days for weekly ones
+def digest_period(frequency, send_date):
+    end = send_date - timedelta(days=1)
+    return (end - timedelta(days=6) if frequency == 'weekly' else end), end
+
+
+# Function to turn user_totals rows into {user: {'expense': {category: (cents, count)}, 'income': cents}}
+def group_totals(rows):
+    totals = defaultdict(lambda: {'expense': {}, 'income': 0})
+    for user, transaction_type, category, cents, count in rows:
+        if transaction_type == 'income':
+            totals[user]['income'] += int(cents)
+        else:
+            totals[user]['expense'][category or UNCATEGORIZED] = (int(cents), int(count))
+    return totals
+
+
+def format_digest(frequency, start, end, totals):
+    title = f"📬 *Daily digest for {end:%a %d %b}*" if frequency == 'daily' else \
+        f"📬 *Weekly digest {start:%d %b} → {end:%d %b}*"
+    expenses = totals['expense'] if totals else {}
+    income = totals['income'] if totals else 0
+    if not expenses and not income:
+        return f"{title}\n\nNo transactions recorded. Use /start to add one."
+
+    spent = sum(cents for cents, _ in expenses.values())
+    lines = [title, ""]
+    top = sorted(expenses.items(), key=lambda item: -item[1][0])
+    for category, (cents, count) in top[:DIGEST_TOP_CATEGORIES]:
+        lines.append(f"• {category}: ₹{to_decimal(cents):,.2f} ({count})")
+    if len(top) > DIGEST_TOP_CATEGORIES:
+        rest = sum(cents for _, (cents, _) in top[DIGEST_TOP_CATEGORIES:])
+        lines.append(f"• {len(top) - DIGEST_TOP_CATEGORIES} more: ₹{to_decimal(rest):,.2f}")
+    lines.append("")
+    lines.append(f"💸 Expenses: ₹{to_decimal(spent):,.2f}")
+    lines.append(f"💰 Income: ₹{to_decimal(income):,.2f}")
+    lines.append(f"🧮 Net: ₹{to_decimal(income - spent):,.2f}")
+    return "\n".join(lines)
+
+
+# Function to work out which send-time bucket a job run at `now` covers:
+# (send date, first minute, end minute). Runs are scheduled on bucket
+# boundaries, so `now` is rounded to the nearest one to absorb scheduler jitter.
+def due_bucket(now, bucket_minutes=DIGEST_BUCKET_MINUTES):
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    minutes = round((now - midnight).total_seconds() / 60 / bucket_minutes) * bucket_minutes
+    slot_start = midnight + timedelta(minutes=minutes - bucket_minutes)
+    first_minute = slot_start.hour * 60 + slot_start.minute
+    return slot_start.date(), first_minute, first_minute + bucket_minutes
+
+
+# Function to build the digests for one bucket: [(chat_id, text), ...].
+# One subscriptions query, then one grouped daily_totals read per frequency
+# for every user in the bucket. Blocking; run it with run_db.
+def build_bucket(send_date, first_minute, end_minute):
+    subscriptions = get_digest_subscriptions(first_minute, end_minute)
+    messages = []
+    for frequency in DIGEST_FREQUENCIES:
+        if frequency == 'weekly' and send_date.weekday() != DIGEST_WEEKDAY:
+            continue
+        due = [(chat_id, username) for chat_id, username, f, _ in subscriptions if f == frequency]
+        if not due:
+            continue
+        start, end = digest_period(frequency, send_date)
+        totals = group_totals(get_user_totals(start, end, [username for _, username in due]))
+        messages.extend((chat_id, format_digest(frequency, start, end, totals.get(username))) for chat_id, username in due)
+    return messages
+
+
+async def _send(bot, chat_id, text):
+    # Digests queue behind interactive replies in the outbound rate limiter
+    kwargs = {'rate_limit_args': {'priority': BULK}} if bot.rate_limiter is not None else {}
+    try:
+        await bot.send_message(chat_id, text, parse_mode='Markdown', **kwargs)
+        return True
+    except Forbidden:
+        # The user blocked the bot or left the chat; stop sending to it
+        logger.info("Dropping digest subscription of chat %s: bot was blocked", chat_id)
+        await run_db(delete_digest_subscription, chat_id)
+    except TelegramError as exc:
+        logger.warning("Could not send digest to chat %s: %s", chat_id, exc)
+    return False
+
+
+# JobQueue callback, run on every bucket boundary
+async def send_digests(context):
+    send_date, first_minute, end_minute = due_bucket(datetime.now())
+    messages = await run_db(build_bucket, send_date, first_minute, end_minute)
+    if not messages:
+        return
+    sent = await asyncio.gather(*(_send(context.bot, chat_id, text) for chat_id, text in messages))
+    logger.info("Sent %s of %s digests for %s-%s", sum(sent), len(messages),
+                format_send_time(first_minute), format_send_time(end_minute))
+
+
+# Function to schedule send_digests on every bucket boundary. Buckets that
+# fell in a downtime are not sent afterwards.
+def schedule_digests(application):
+    if application.job_queue is None:
+        logger.warning("Digests are disabled: install python-telegram-bot[job-queue]")
+        return
+    now = datetime.now()
+    step = timedelta(minutes=DIGEST_BUCKET_MINUTES)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    first = midnight + ((now - midnight) // step + 1) * step
+    application.job_queue.run_repeating(
+        send_digests, interval=step, first=(first - now).total_seconds(), name='digests'
+    )
+
+
+# /digest daily|weekly HH:MM | off — without arguments shows the current setting
+async def digest_command(update, context):
+    args = [a.lower() for a in context.args or []]
+    chat_id = update.effective_chat.id
+    usage = ("Usage: /digest daily 08:00 | /digest weekly 09:30 | /digest off\n"
+             f"Daily digests cover the previous day; weekly ones go out on {WEEKDAYS[DIGEST_WEEKDAY]}s "
+             "and cover the previous 7 days.")
+
+    if not args:
+        rows = await run_db(get_digest_subscriptions, 0, 24 * 60, chat_id)
+        if rows:
+            _, _, frequency, minute = rows[0]
+            await update.message.reply_text(f"You get a {frequency} digest at {format_send_time(minute)}.\n\n{usage}")
+        else:
+            await update.message.reply_text(f"Digests are off.\n\n{usage}")
+        return
+
+    if args[0] == 'off':
+        deleted = await run_db(delete_digest_subscription, chat_id)
+        await update.message.reply_text("Digests turned off." if deleted else "Digests were already off.")
+        return
+
+    if args[0] not in DIGEST_FREQUENCIES or len(args) != 2:
+        await update.message.reply_text(usage)
+        return
+    try:
+        minute = parse_send_time(args[1])
+    except ValueError as exc:
+        await update.message.reply_text(f"{exc}\n\n{usage}")
+        return
+
+    user = update.effective_user
+    username = user.username or user.full_name
+    await run_db(save_digest_subscription, chat_id, username, args[0], minute)
+    when = "every day" if args[0] == 'daily' else f"every {WEEKDAYS[DIGEST_WEEKDAY]}"
+    await update.message.reply_text(f"✅ You'll get a {args[0]} digest {when} at {format_send_time(minute)}.")
@@ -0,0 +1,75 @@
+import csv
+import gzip
+import io
+import json
+import os
+
+from db import iter_transactions
+from metrics import timed_query
+
+# Exports are written to a SpooledTemporaryFile: kept in memory up to this
+# many bytes, then moved to a temp file on disk
+EXPORT_SPOOL_BYTES = int(os.getenv('EXPORT_SPOOL_BYTES', str(1024 * 1024)))
+# Rows fetched from the database per chunk
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '1000'))
+
+EXPORT_FORMATS = {
+    'csv': '.csv',
+    'jsonl': '.jsonl.gz',
+}
+EXPORT_COLUMNS = ('timestamp', 'amount', 'type', 'category', 'description')
+
+
+def _csv_rows(rows):
+    for timestamp, amount, transaction_type, category, description in rows:
+        yield (timestamp.strftime('%Y-%m-%d %H:%M:%S'), amount, transaction_type, category or '', description or '')
+
+
+def _jsonl_lines(rows):
+    for timestamp, amount, transaction_type, category, description in rows:
+        yield json.dumps({
+            'timestamp': timestamp.isoformat(),
+            'amount': str(amount),  # Exact decimal, not a float
+            'type': transaction_type,
+            'category': category,
+            'description': description,
+        }, ensure_ascii=False) + '\n'
+
+
+# Function to write a user's transactions for a period to the binary file `out`
+# as CSV or gzip-compressed JSON lines, one database chunk at a time.
+# Returns the number of rows written. Blocking: run it with run_db().
+@timed_query('export_transactions')
+def export_transactions(username, start_date, end_date, out, fmt='csv'):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+
+    count = 0
+    chunks = iter_transactions(username, start_date, end_date, EXPORT_FETCH_SIZE)
+    try:
+        if fmt == 'jsonl':
+            with gzip.GzipFile(fileobj=out, mode='wb') as compressed:
+                text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+                for rows in chunks:
+                    text.writelines(_jsonl_lines(rows))
+                    count += len(rows)
+                text.flush()
+                text.detach()  # Leave closing to the GzipFile
+        else:
+            # utf-8-sig so spreadsheet apps detect the encoding
+            text = io.TextIOWrapper(out, encoding='utf-8-sig', newline='')
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in chunks:
+                writer.writerows(_csv_rows(rows))
+                count += len(rows)
+            text.flush()
+            text.detach()  # Keep `out` open for the caller
+    finally:
+        chunks.close()
+    return count
+
+
+# Function to build the download file name for an export
+def export_filename(start_date, end_date, fmt='csv'):
+    return f"transactions_{start_date:%Y%m%d}_{end_date:%Y%m%d}{EXPORT_FORMATS[fmt]}"
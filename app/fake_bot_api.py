@@ -0,0 +1,105 @@
+import itertools
+import json
+import time
+
+from telegram.request import BaseRequest
+
+# In-process stand-in for the Telegram Bot API, for local test runs.
+# Plug it into the Application builder with .request(FakeBotRequest()) and
+# every Bot API call is answered locally and recorded in `calls` instead of
+# going over the network, so fake updates can drive the real handlers.
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Expense Tracker', 'username': 'fake_expense_bot'}
+
+MESSAGE_METHODS = {
+    'sendMessage', 'editMessageText', 'editMessageReplyMarkup',
+    'sendDocument', 'sendPhoto', 'copyMessage', 'forwardMessage',
+}
+
+
+class FakeBotRequest(BaseRequest):
+    def __init__(self, max_calls=1000):
+        self.calls = []
+        self.max_calls = max_calls
+        self._message_ids = itertools.count(1)
+        # Responses queued with fail_next() are returned before normal answers
+        self._failures = []
+        # Flood limits enforced when limit_rates() was called
+        self._limits = None
+        self._sent = {}  # chat_id (None = all chats) -> recent send times
+        self.flood_errors = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    # Function to make the next call(s) answer with an error, e.g. a 429
+    # flood-wait: fail_next(429, "Too Many Requests: retry after 3", retry_after=3)
+    def fail_next(self, status_code, description, retry_after=None, times=1):
+        body = {'ok': False, 'error_code': status_code, 'description': description}
+        if retry_after is not None:
+            body['parameters'] = {'retry_after': retry_after}
+        self._failures.extend([(status_code, body)] * times)
+
+    # Function to answer 429 like Telegram does when a chat gets more than
+    # `per_chat` messages or the bot more than `overall` messages per `window`
+    # seconds (the documented limits are about 1/s per chat and 30/s overall)
+    def limit_rates(self, per_chat=1, overall=30, window=1.0, retry_after=1):
+        self._limits = (per_chat, overall, window, retry_after)
+
+    def _flooded(self, chat_id):
+        per_chat, overall, window, _ = self._limits
+        now = time.monotonic()
+        for key, limit in ((chat_id, per_chat), (None, overall)):
+            recent = self._sent.setdefault(key, [])
+            while recent and recent[0] <= now - window:
+                recent.pop(0)
+            if len(recent) >= limit:
+                return True
+        self._sent[chat_id].append(now)
+        self._sent[None].append(now)
+        return False
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls.append({'method': api_method, 'params': params, 'at': time.time()})
+        del self.calls[:-self.max_calls]
+
+        if self._failures:
+            status_code, body = self._failures.pop(0)
+            return status_code, json.dumps(body).encode()
+        if self._limits is not None and api_method in MESSAGE_METHODS and self._flooded(params.get('chat_id')):
+            self.flood_errors += 1
+            retry_after = self._limits[3]
+            body = {'ok': False, 'error_code': 429, 'description': f"Too Many Requests: retry after {retry_after}",
+                    'parameters': {'retry_after': retry_after}}
+            return 429, json.dumps(body).encode()
+
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode()
+
+    def _result(self, api_method, params):
+        if api_method == 'getMe':
+            return BOT_USER
+        if api_method in MESSAGE_METHODS:
+            message = {
+                'message_id': params.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 0), 'type': 'private'},
+                'from': BOT_USER,
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            if api_method == 'sendDocument':
+                file_id = f"fake-document-{message['message_id']}"
+                message['document'] = {'file_id': file_id, 'file_unique_id': file_id}
+            if api_method == 'sendPhoto':
+                file_id = f"fake-photo-{message['message_id']}"
+                message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]
+            return message
+        if api_method == 'getUpdates':
+            return []
+        return True
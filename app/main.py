@@ -1,10 +1,21 @@
 Version = "1_0"
+from startup import startup_timer
 import logging
 import os
-from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 #from telegram_bot import start, amount, transaction_type, category, description, error, cancel, help_command, show_today, show_week, show_month, menu_callback
-from telegram_bot import *
+from telegram_bot import load_handlers
 from dotenv import load_dotenv
+from charts import chart_renderer
+from categories import categories_command, category_cache
+from db import bootstrap_schema, run_db, shutdown_db
+from digests import digest_command, schedule_digests
+from metrics import count_error, instrument_handler, register_application, start_metrics_server
+from outbound import FloodAwareRateLimiter
+from profiling import profile_command, profiler, start_profile_from_env
+from update_processor import PerChatUpdateProcessor
+from persistence import DBPersistence
 
 
 # Load environment variables from .env file
@@ -12,43 +23,131 @@ load_dotenv()
 
 # Get the Telegram bot token from environment variables
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_TOKEN')
+if not TELEGRAM_BOT_TOKEN and os.getenv('WEBHOOK_TEST_MODE', '0').lower() in ('1', 'true', 'yes'):
+    TELEGRAM_BOT_TOKEN = '123456:local-test-token'  # Never sent anywhere in test mode
 
 # Constants for conversation states (must match telegram_bot.py)
 #START, AMOUNT, TYPE, CATEGORY, DESCRIPTION = range(5)
 START, AMOUNT, CATEGORY, DESCRIPTION = range(4)
 
-# Main function to run the bot
-def main():
-    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+# Log how long the process took to become ready
+async def on_startup(application):
+    register_application(application)
+    # Category keyboards are served from memory from the first update on
+    await run_db(category_cache.load)
+    start_profile_from_env()
+    schedule_digests(application)
+    startup_timer.mark_ready()
+
+# Flush write-behind saves, close DB connections and stop chart workers before the process exits
+async def on_shutdown(application):
+    await shutdown_db()
+    chart_renderer.shutdown()
 
-    # Initialize the bot with the token from environment variable
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+# Run mode: "polling" (default) or "webhook" (see webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+# Pace outgoing messages to Telegram's flood limits (see outbound.py)
+OUTBOUND_RATE_LIMIT = os.getenv('OUTBOUND_RATE_LIMIT', '1').lower() in ('1', 'true', 'yes')
+# Keep conversation state and user_data in the database across restarts
+BOT_PERSISTENCE = os.getenv('BOT_PERSISTENCE', '1').lower() in ('1', 'true', 'yes')
+
+# Function to build the Application and register all handlers
+def build_application(webhook=False, request=None, handlers=None):
+    bot = handlers or load_handlers()
+    # Every handler is timed under its function name and can be profiled with /profile
+    h = lambda callback: instrument_handler(callback.__name__, profiler.wrap(callback.__name__, callback))
+
+    # Updates run concurrently (MAX_CONCURRENT_UPDATES), but in order per chat
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if webhook:
+        # Updates arrive over HTTP instead of the polling Updater
+        builder = builder.updater(None)
+    if OUTBOUND_RATE_LIMIT:
+        builder = builder.rate_limiter(FloodAwareRateLimiter())
+    if BOT_PERSISTENCE:
+        builder = builder.persistence(DBPersistence())
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
 
     # Conversation handler for user interaction
     conversation_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start), CommandHandler('cancel', cancel)],
+        entry_points=[CommandHandler('start', h(bot.start)), CommandHandler('cancel', h(bot.cancel))],
         states={
-            AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, amount)],
+            AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, h(bot.amount))],
             #TYPE: [CallbackQueryHandler(transaction_type)], # Removed Type
-            CATEGORY: [CallbackQueryHandler(category)],
-            DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, description)],
+            CATEGORY: [CallbackQueryHandler(h(bot.category))],
+            DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, h(bot.description))],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', h(bot.cancel))],
+        name='transaction',
+        persistent=BOT_PERSISTENCE,
     )
 
+    # Runs before every other handler; only records when the first update arrived
+    application.add_handler(TypeHandler(Update, startup_timer.first_update), group=-1)
+
+    # Count errors by type for /metrics
+    application.add_error_handler(count_error)
+
     # Add the conversation handler to the bot
     application.add_handler(conversation_handler)
-    application.add_handler(CommandHandler('help', help_command))
-    application.add_handler(CallbackQueryHandler(menu_callback, pattern="^(start|today|week|month)$"))
-    application.add_handler(CommandHandler("today", show_today))
-    application.add_handler(CommandHandler("week", show_week))
-    application.add_handler(CommandHandler("month", show_month))
-    application.add_handler(CommandHandler("summary", show_summary))
-    application.add_handler(CallbackQueryHandler(summary_callback, pattern='^summary_'))
+    # Free-form "250 food lunch" entries; text inside the conversation is handled above
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, h(bot.quick_entry)))
+    application.add_handler(CommandHandler('help', h(bot.help_command)))
+    application.add_handler(CommandHandler('profile', profile_command))
+    csv_document = filters.Document.FileExtension('csv') | filters.Document.MimeType('text/csv')
+    application.add_handler(MessageHandler(csv_document, h(bot.import_document)))
+    application.add_handler(CallbackQueryHandler(h(bot.menu_callback), pattern="^(start|today|week|month)$"))
+    application.add_handler(CommandHandler("today", h(bot.show_today)))
+    application.add_handler(CommandHandler("week", h(bot.show_week)))
+    application.add_handler(CommandHandler("month", h(bot.show_month)))
+    application.add_handler(CommandHandler("summary", h(bot.show_summary)))
+    application.add_handler(CommandHandler("report", h(bot.report_command)))
+    application.add_handler(CommandHandler("export", h(bot.export_command)))
+    application.add_handler(CommandHandler("digest", h(digest_command)))
+    application.add_handler(CommandHandler("categories", h(categories_command)))
+    application.add_handler(CallbackQueryHandler(h(bot.summary_callback), pattern='^summary_'))
+    application.add_handler(CallbackQueryHandler(h(bot.report_page_callback), pattern=r'^pg\|'))
+    application.add_handler(CallbackQueryHandler(h(bot.report_callback), pattern=r'^rp\|'))
+    application.add_handler(CallbackQueryHandler(h(bot.chart_callback), pattern=r'^chart\|'))
+
+    return application
+
+# Main function to run the bot
+def main():
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    startup_timer.record_since_start('imports')
+    start_metrics_server()
+
+    with startup_timer.stage('import handlers'):
+        handlers = load_handlers()
+
+    # Explicit schema phase: one schema_version check, retried while the DB starts up
+    with startup_timer.stage('schema bootstrap'):
+        bootstrap_schema()
 
+    if BOT_MODE == 'webhook':
+        from webhook import WEBHOOK_TEST_MODE, run_webhook
 
-    # Start polling
-    application.run_polling()
+        fake_bot_api = None
+        if WEBHOOK_TEST_MODE:
+            from fake_bot_api import FakeBotRequest
+            fake_bot_api = FakeBotRequest()
+        with startup_timer.stage('build application'):
+            application = build_application(webhook=True, request=fake_bot_api, handlers=handlers)
+        run_webhook(application, fake_bot_api)
+    else:
+        with startup_timer.stage('build application'):
+            application = build_application(handlers=handlers)
+        # Start polling
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
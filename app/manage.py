@@ -0,0 +1,41 @@
+import argparse
+import logging
+import sys
+
+from db import bootstrap_schema, rebuild_daily_totals
+
+# Maintenance commands, run from the app directory:
+#   python manage.py rebuild-rollup [--chunk-days N]
+#   python manage.py rebuild-rollup --verify
+
+def rebuild_rollup(args):
+    mismatched_days = rebuild_daily_totals(chunk_days=args.chunk_days, verify=args.verify)
+    if not args.verify:
+        print("daily_totals rebuilt from transactions.")
+        return 0
+    if mismatched_days:
+        print(f"daily_totals differs from transactions on {len(mismatched_days)} day(s):")
+        for day in mismatched_days:
+            print(f"  {day}")
+        return 1
+    print("daily_totals matches transactions.")
+    return 0
+
+
+def main(argv=None):
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Expense Tracker maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-rollup", help="Recompute daily_totals from raw transactions")
+    rebuild.add_argument("--chunk-days", type=int, default=31, help="Days recomputed per database transaction")
+    rebuild.add_argument("--verify", action="store_true", help="Only compare daily_totals against transactions")
+    rebuild.set_defaults(func=rebuild_rollup)
+
+    args = parser.parse_args(argv)
+    bootstrap_schema()
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
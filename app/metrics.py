@@ -0,0 +1,129 @@
+import functools
+import logging
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Port for the Prometheus /metrics endpoint (0 disables it). Not 9100, which
+# node_exporter usually holds on the same host; 8001 sits next to the web app's 8000.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '8001'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_latency_seconds', 'Time spent in a bot handler', ['handler'], buckets=LATENCY_BUCKETS
+)
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Exceptions raised by bot handlers', ['handler'])
+ERRORS = Counter('bot_errors_total', 'Errors reported to the application error handler', ['type'])
+
+DB_QUERY_LATENCY = Histogram(
+    'bot_db_query_seconds', 'Time spent in a db.py query', ['query'], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_ROWS = Counter('bot_db_query_rows_total', 'Rows read or written by db.py queries', ['query'])
+DB_QUERY_ERRORS = Counter('bot_db_query_errors_total', 'Failed db.py queries', ['query'])
+
+OUTBOUND_WAITING = Gauge('bot_outbound_waiting', 'Outgoing Bot API calls waiting for a send slot', ['priority'])
+OUTBOUND_WAIT = Histogram(
+    'bot_outbound_wait_seconds', 'Time outgoing calls waited for the rate limiter', ['priority'], buckets=LATENCY_BUCKETS
+)
+OUTBOUND_RETRIES = Counter('bot_outbound_retry_after_total', 'Outgoing calls retried after a 429 RetryAfter')
+OUTBOUND_COALESCED = Counter('bot_outbound_coalesced_edits_total', 'Message edits dropped for a newer edit of the same message')
+
+DB_POOL_IN_USE = Gauge('bot_db_pool_connections_in_use', 'Pooled DB connections checked out')
+DB_POOL_SIZE = Gauge('bot_db_pool_size', 'Max pooled DB connections')
+UPDATE_BACKLOG = Gauge('bot_update_queue_size', 'Updates received but not yet picked up')
+ACTIVE_CHATS = Gauge('bot_active_chats', 'Chats with an update in progress or waiting')
+WRITE_BEHIND_DEPTH = Gauge('bot_write_behind_queue_size', 'Saves waiting in the write-behind queue')
+REPORT_CACHE_HITS = Gauge('bot_report_cache_hits', 'Report cache hits since start')
+REPORT_CACHE_MISSES = Gauge('bot_report_cache_misses', 'Report cache misses since start')
+REPORT_CACHE_ENTRIES = Gauge('bot_report_cache_entries', 'Results held in the report cache')
+
+
+def _row_count(result):
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result  # Functions that report how many rows they wrote
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])  # (rows, has_more) / (totals, grand_total)
+    if isinstance(result, (list, tuple, set, dict)):
+        return len(result)
+    return 0
+
+# Decorator for db.py functions: per-query latency, row count and errors.
+# Rows are counted from the return value, or from the first list argument
+# for writes that return nothing (save_many_to_db(rows),
+# replace_categories(owner_id, rows)).
+def timed_query(name):
+    def decorator(func):
+        latency = DB_QUERY_LATENCY.labels(name)
+        rows = DB_QUERY_ROWS.labels(name)
+        errors = DB_QUERY_ERRORS.labels(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+            if result is None:
+                result = next((arg for arg in args if isinstance(arg, (list, tuple))), None)
+            rows.inc(_row_count(result))
+            return result
+        return wrapper
+    return decorator
+
+# Function to wrap a handler callback in a latency histogram and error counter
+def instrument_handler(name, callback):
+    latency = HANDLER_LATENCY.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - started)
+    return wrapper
+
+# Error handler for the Application: count by exception type, then log
+async def count_error(update, context):
+    ERRORS.labels(type(context.error).__name__).inc()
+    logger.error("Exception while handling an update", exc_info=context.error)
+
+# Function to point the gauges at the live application, DB and caches.
+# Gauges read their value when Prometheus scrapes, so this costs nothing per update.
+def register_application(application):
+    import db
+    from report_cache import report_cache
+
+    def pool_attr(attr):
+        storage = db._storage
+        pool = getattr(storage, 'pool', None)
+        return getattr(pool, attr, 0) if pool is not None else 0
+
+    DB_POOL_IN_USE.set_function(lambda: pool_attr('in_use'))
+    DB_POOL_SIZE.set_function(lambda: pool_attr('size'))
+    UPDATE_BACKLOG.set_function(application.update_queue.qsize)
+    ACTIVE_CHATS.set_function(lambda: getattr(application.update_processor, 'active_chats', 0))
+    WRITE_BEHIND_DEPTH.set_function(
+        lambda: len(db._write_behind_queue) if db._write_behind_queue is not None else 0
+    )
+    REPORT_CACHE_HITS.set_function(lambda: report_cache.hits)
+    REPORT_CACHE_MISSES.set_function(lambda: report_cache.misses)
+    REPORT_CACHE_ENTRIES.set_function(lambda: len(report_cache))
+
+# Function to serve /metrics in a background thread
+def start_metrics_server(port=METRICS_PORT):
+    if port:
+        start_http_server(port)
+        logger.info("Prometheus metrics on :%s/metrics", port)
@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import nullcontext
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import OUTBOUND_COALESCED, OUTBOUND_RETRIES, OUTBOUND_WAIT, OUTBOUND_WAITING
+
+logger = logging.getLogger(__name__)
+
+# Telegram's documented limits: about 30 messages per second overall, one
+# per second in a private chat (short bursts are tolerated) and 20 per
+# minute in a group
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '28'))  # A little under the limit
+OUTBOUND_GLOBAL_BURST = int(os.getenv('OUTBOUND_GLOBAL_BURST', '5'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_GROUP_RATE = float(os.getenv('OUTBOUND_GROUP_RATE', str(20 / 60)))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+# Attempts after a 429 before the RetryAfter is passed to the caller
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+# Priorities for rate_limit_args={'priority': ...}; lower is sent first
+INTERACTIVE = 0   # Replies to something the user just did (default)
+BULK = 10         # Digests, broadcasts
+
+# Only calls that post to a chat count against the flood limits;
+# answerCallbackQuery, getFile, setWebhook, ... go straight through
+LIMITED_PREFIXES = ('send', 'edit', 'copyMessage', 'forwardMessage')
+# Edits where only the newest text for a message matters
+COALESCED_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    # Seconds until a token is available (0 if one is available now)
+    def delay(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def idle(self):
+        return self.delay() == 0 and self.tokens >= self.capacity
+
+
+class _Chat:
+    __slots__ = ('lock', 'bucket')
+
+    def __init__(self, rate, burst):
+        self.lock = asyncio.Lock()  # FIFO: keeps a chat's messages in order
+        self.bucket = TokenBucket(rate, burst)
+
+
+def _priority_name(priority):
+    return 'interactive' if priority <= INTERACTIVE else 'bulk'
+
+
+# Outbound send layer, plugged into the Application with .rate_limiter().
+# Every message-posting Bot API call waits for a token from its chat's bucket
+# (in order, per chat) and then for a slot from the global bucket; global
+# slots go to the lowest priority number first, so interactive replies
+# overtake queued digests. Edits of a message that is still waiting are
+# replaced by the newer edit. A 429 pauses the chat (or everything, for
+# calls without a chat) for retry_after seconds and the call is retried.
+class FloodAwareRateLimiter(BaseRateLimiter):
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, global_burst=OUTBOUND_GLOBAL_BURST,
+                 chat_rate=OUTBOUND_CHAT_RATE, group_rate=OUTBOUND_GROUP_RATE,
+                 chat_burst=OUTBOUND_CHAT_BURST, max_retries=OUTBOUND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats = {}       # chat_id -> _Chat
+        self._waiting = []     # heap of (priority, sequence, future) for global slots
+        self._sequence = itertools.count()
+        self._edits = {}       # (chat_id, message_id) -> sequence of the newest edit
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def initialize(self):
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, future in self._waiting:
+            future.cancel()
+        self._waiting.clear()
+
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) > 10000:
+                self._forget_idle_chats()
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            chat = self._chats[chat_id] = _Chat(self.group_rate if is_group else self.chat_rate, self.chat_burst)
+        return chat
+
+    def _forget_idle_chats(self):
+        for chat_id in [c for c, chat in self._chats.items() if not chat.lock.locked() and chat.bucket.idle()]:
+            del self._chats[chat_id]
+
+    # Hands out global slots in priority order at the global rate
+    async def _dispatch(self):
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self.global_bucket.take()
+                future.set_result(None)
+
+    async def _global_slot(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(LIMITED_PREFIXES) or self._dispatcher is None:
+            return await callback(*args, **kwargs)
+
+        priority = (rate_limit_args or {}).get('priority', INTERACTIVE)
+        label = _priority_name(priority)
+        chat_id = data.get('chat_id')
+        chat = self._chat(chat_id) if chat_id is not None else None
+
+        edit_key = None
+        if endpoint in COALESCED_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'])
+            edit_sequence = next(self._sequence)
+            self._edits[edit_key] = edit_sequence
+
+        started = time.monotonic()
+        OUTBOUND_WAITING.labels(label).inc()
+        try:
+            # Retries happen under the chat lock, so later messages cannot overtake
+            async with chat.lock if chat is not None else nullcontext():
+                for attempt in itertools.count():
+                    if chat is not None:
+                        while (delay := chat.bucket.delay()) > 0:
+                            await asyncio.sleep(delay)
+                            if edit_key is not None and self._edits.get(edit_key) != edit_sequence:
+                                break
+                    if edit_key is not None and self._edits.get(edit_key) != edit_sequence:
+                        # A newer edit of this message is queued; it carries the final text
+                        OUTBOUND_COALESCED.inc()
+                        return True
+                    await self._global_slot(priority)
+                    if chat is not None:
+                        chat.bucket.take()
+                    if started is not None:
+                        OUTBOUND_WAITING.labels(label).dec()
+                        OUTBOUND_WAIT.labels(label).observe(time.monotonic() - started)
+                        started = None
+
+                    try:
+                        return await callback(*args, **kwargs)
+                    except RetryAfter as exc:
+                        OUTBOUND_RETRIES.inc()
+                        if attempt >= self.max_retries:
+                            raise
+                        logger.info("Flood wait of %ss for %s to chat %s (attempt %s)",
+                                    exc.retry_after, endpoint, chat_id, attempt + 1)
+                        (chat.bucket if chat is not None else self.global_bucket).pause(exc.retry_after)
+        finally:
+            if started is not None:
+                OUTBOUND_WAITING.labels(label).dec()
+            if edit_key is not None and self._edits.get(edit_key) == edit_sequence:
+                del self._edits[edit_key]
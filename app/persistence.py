@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db import load_conversations, load_user_state, run_db, save_bot_state
+
+logger = logging.getLogger(__name__)
+
+# Persistence settings
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '30'))  # Seconds between batched flushes
+PERSISTENCE_ACTIVE_HOURS = float(os.getenv('PERSISTENCE_ACTIVE_HOURS', '24'))        # Conversations older than this are not restored
+
+
+# Stores user_data and ConversationHandler states in the bot's database.
+#
+# * user_data is loaded lazily: nothing at startup, then one query the first
+#   time a user sends an update to this process (refresh_user_data).
+# * Conversation states are loaded at startup, but only those touched within
+#   PERSISTENCE_ACTIVE_HOURS.
+# * The Application hands over changed state every PERSISTENCE_UPDATE_INTERVAL
+#   seconds; those changes are buffered and written in one transaction.
+class DBPersistence(BasePersistence):
+    def __init__(self, update_interval=PERSISTENCE_UPDATE_INTERVAL, active_hours=PERSISTENCE_ACTIVE_HOURS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.active_hours = active_hours
+        self._loaded_users = set()
+        self._dirty_users = {}          # user_id -> data JSON
+        self._dropped_users = set()
+        self._dirty_conversations = {}  # (name, key JSON) -> state JSON, or None when ended
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    # Loading
+
+    async def get_user_data(self):
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        stored = await run_db(load_user_state, user_id)
+        if stored and not user_data:
+            user_data.update(json.loads(stored))
+
+    async def get_conversations(self, name):
+        since = datetime.now() - timedelta(hours=self.active_hours)
+        rows = await run_db(load_conversations, name, since)
+        logger.info("Restored %s active '%s' conversations", len(rows), name)
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    # Buffering changes
+
+    async def update_user_data(self, user_id, data):
+        self._loaded_users.add(user_id)
+        self._dropped_users.discard(user_id)
+        self._dirty_users[user_id] = json.dumps(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._dirty_users.pop(user_id, None)
+        self._dropped_users.add(user_id)
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        state = None if new_state is None else json.dumps(new_state)
+        self._dirty_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_flush()
+
+    # Writing
+
+    def _schedule_flush(self):
+        # Application.update_persistence hands over all changes in one pass,
+        # so a single flush scheduled behind the first change picks them all up.
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        async with self._flush_lock:
+            user_rows = list(self._dirty_users.items())
+            dropped = list(self._dropped_users)
+            conversation_rows = [(name, key, state) for (name, key), state in self._dirty_conversations.items()]
+            self._dirty_users, self._dropped_users, self._dirty_conversations = {}, set(), {}
+            if not (user_rows or dropped or conversation_rows):
+                return
+            try:
+                await run_db(save_bot_state, user_rows, dropped, conversation_rows)
+            except Exception:
+                # Keep the changes for the next flush unless they were superseded meanwhile
+                for user_id, data in user_rows:
+                    self._dirty_users.setdefault(user_id, data)
+                self._dropped_users.update(user_id for user_id in dropped if user_id not in self._dirty_users)
+                for name, key, state in conversation_rows:
+                    self._dirty_conversations.setdefault((name, key), state)
+                raise
+            logger.debug(
+                "Persisted %s user_data, %s drops, %s conversation states",
+                len(user_rows), len(dropped), len(conversation_rows)
+            )
+
+    # Unused data kinds (disabled in store_data)
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
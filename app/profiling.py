@@ -0,0 +1,202 @@
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Telegram user ids allowed to run /profile (comma separated)
+ADMIN_USER_IDS = {int(i) for i in os.getenv('ADMIN_USER_IDS', '').replace(' ', '').split(',') if i}
+# Where .prof files are written (open them with snakeviz or pstats)
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# Start a capture at boot, e.g. "200" (updates) or "60s" (seconds); empty = off
+PROFILE_ON_START = os.getenv('PROFILE_ON_START', '')
+# Functions listed in the summary reply
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '12'))
+
+# Upper bounds so a typo cannot leave profiling on for days
+MAX_PROFILE_UPDATES = 10000
+MAX_PROFILE_SECONDS = 3600
+
+_LIMIT_RE = re.compile(r'^(\d+)(s?)$')
+
+
+# Function to parse "200" (updates) or "60s" (seconds) into (updates, seconds)
+def parse_limit(text):
+    match = _LIMIT_RE.match(text.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Expected a number of updates (e.g. 200) or seconds (e.g. 60s), got {text!r}")
+    value = int(match.group(1))
+    if match.group(2):
+        return None, min(value, MAX_PROFILE_SECONDS)
+    return min(value, MAX_PROFILE_UPDATES), None
+
+
+# cProfile capture for the live handlers, for the next N updates or a time
+# window. While idle, a wrapped handler only checks one boolean. While a
+# capture runs, profiled handler calls are serialized (cProfile can only have
+# one active profiler per thread); that slows the bot down, so captures are
+# bounded. cProfile follows the thread, not the coroutine: while a handler
+# awaits, whatever else the event loop runs (PTB internals, jobs, persistence
+# flushes) is recorded in that handler's profile too. Database work done in
+# run_db's executor threads is not recorded, only the time spent awaiting it.
+class HandlerProfiler:
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.active = False
+        self._profiles = {}   # handler name -> cProfile.Profile
+        self._calls = {}      # handler name -> calls profiled
+        self._lock = asyncio.Lock()
+        self._remaining = None
+        self._timer = None
+        self._started = None
+        self._on_done = None
+
+    def wrap(self, name, callback):
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            if not self.active:
+                return await callback(update, context)
+            return await self._profile_call(name, callback, update, context)
+        return wrapper
+
+    async def _profile_call(self, name, callback, update, context):
+        async with self._lock:
+            if not self.active:
+                return await callback(update, context)
+            profile = self._profiles.get(name)
+            if profile is None:
+                profile = self._profiles[name] = cProfile.Profile()
+            self._calls[name] = self._calls.get(name, 0) + 1
+            profile.enable()
+            try:
+                return await callback(update, context)
+            finally:
+                profile.disable()
+                if self._remaining is not None:
+                    self._remaining -= 1
+                    if self._remaining <= 0:
+                        self._finish()
+
+    # Function to start a capture; on_done(summary, paths) is awaited when it ends
+    def start(self, updates=None, seconds=None, on_done=None):
+        if self.active:
+            raise RuntimeError("A profile is already running")
+        self._profiles, self._calls = {}, {}
+        self._remaining = updates
+        self._on_done = on_done
+        self._started = time.perf_counter()
+        if seconds:
+            self._timer = asyncio.get_running_loop().call_later(seconds, self._finish)
+        self.active = True
+        logger.info("Profiling started for %s", f"{updates} updates" if updates else f"{seconds}s")
+
+    def stop(self):
+        if self.active:
+            self._finish()
+
+    def _finish(self):
+        if not self.active:
+            return
+        self.active = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        profiles, calls, on_done = self._profiles, self._calls, self._on_done
+        elapsed = time.perf_counter() - self._started
+        self._profiles, self._calls, self._on_done = {}, {}, None
+        asyncio.get_running_loop().create_task(self._report(profiles, calls, elapsed, on_done))
+
+    async def _report(self, profiles, calls, elapsed, on_done):
+        # Writing and sorting stats can take a moment; keep it off the event loop
+        summary, paths = await asyncio.to_thread(self._write, profiles, calls, elapsed)
+        logger.info("Profiling finished, wrote %s\n%s", ", ".join(paths) or "nothing", summary)
+        if on_done is not None:
+            try:
+                await on_done(summary, paths)
+            except Exception:
+                logger.exception("Could not deliver profile summary")
+
+    def _write(self, profiles, calls, elapsed):
+        if not profiles:
+            return f"No handler ran during the {elapsed:.0f}s capture.", []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        paths = []
+        combined = None
+        for name, profile in profiles.items():
+            path = os.path.join(self.profile_dir, f'{stamp}-{name}.prof')
+            profile.dump_stats(path)
+            paths.append(path)
+            if combined is None:
+                combined = pstats.Stats(profile)
+            else:
+                combined.add(profile)
+
+        out = io.StringIO()
+        combined.stream = out
+        combined.strip_dirs().sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        # Keep only the table rows: drop the pstats header and blank lines
+        rows = [line for line in out.getvalue().splitlines() if line.strip()]
+        table = rows[rows.index(next(r for r in rows if r.lstrip().startswith('ncalls'))):]
+
+        handled = ", ".join(f"{name}×{count}" for name, count in sorted(calls.items(), key=lambda i: -i[1]))
+        summary = (
+            f"Profiled {sum(calls.values())} handler calls in {elapsed:.1f}s: {handled}\n"
+            "Includes everything the event loop ran while these handlers were awaiting.\n"
+            + "\n".join(table)
+        )
+        return summary, paths
+
+
+profiler = HandlerProfiler()
+
+
+# /profile <updates|Ns> | stop — admin only, replies with the top functions when done
+async def profile_command(update, context):
+    if update.effective_user is None or update.effective_user.id not in ADMIN_USER_IDS:
+        return
+
+    args = context.args or []
+    if args and args[0].lower() == 'stop':
+        if not profiler.active:
+            await update.message.reply_text("No profile is running.")
+        profiler.stop()
+        return
+    try:
+        updates, seconds = parse_limit(args[0] if args else '100')
+    except ValueError as exc:
+        await update.message.reply_text(f"{exc}\nUsage: /profile <updates|seconds>s | stop")
+        return
+
+    chat_id = update.effective_chat.id
+    bot = context.bot
+
+    async def reply(summary, paths):
+        text = summary if len(summary) < 3900 else summary[:3900] + "\n…"
+        await bot.send_message(chat_id, f"<pre>{_escape(text)}</pre>", parse_mode='HTML')
+
+    try:
+        profiler.start(updates, seconds, on_done=reply)
+    except RuntimeError as exc:
+        await update.message.reply_text(str(exc))
+        return
+    await update.message.reply_text(
+        f"Profiling the next {updates} updates." if updates else f"Profiling for {seconds}s."
+    )
+
+
+# Function to start the PROFILE_ON_START capture (results go to the log and PROFILE_DIR)
+def start_profile_from_env():
+    if PROFILE_ON_START:
+        profiler.start(*parse_limit(PROFILE_ON_START))
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
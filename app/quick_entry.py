@@ -0,0 +1,108 @@
+import difflib
+import functools
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+
+from csv_import import AMOUNT_RE, MAX_AMOUNT
+
+# Lines accepted in one quick-entry message
+QUICK_ENTRY_MAX_LINES = int(os.getenv('QUICK_ENTRY_MAX_LINES', '50'))
+# Category lookups remembered per parser (parsers live as long as the process)
+QUICK_ENTRY_MATCH_CACHE = 256
+
+# "<amount> [category] [description]", e.g. "250 food lunch with team",
+# "₹1,200.50 travel" or "+5000 salary" (a leading + records income)
+LINE_RE = re.compile(
+    r'^\s*(?P<sign>\+)?\s*(?P<currency>₹|rs\.?\s*)?(?P<amount>\d[\d,]*(?:\.\d+)?)'
+    r'(?:\s+(?P<word>\S+))?(?:\s+(?P<rest>.+?))?\s*$',
+    re.IGNORECASE
+)
+# Thousands separators in western (1,234,567) or Indian (12,34,567) grouping
+GROUPED_AMOUNT_RE = re.compile(r'^(\d+|\d{1,3}(,\d{3})+|\d{1,2}(,\d{2})*,\d{3})(\.\d+)?$')
+
+
+# Parses quick-entry messages into save_many_to_db rows. The category is the
+# first word after the amount, matched (ignoring case) exactly, as a unique
+# prefix ("groc") or as the closest spelling ("fod"). A line without a known
+# category is only accepted when the amount is marked as money ("₹45 coffee",
+# "+500 gift"); its words become the description and the category is 'Other'.
+# Otherwise "2 people came" would be saved as an expense.
+class QuickEntryParser:
+    def __init__(self, expense_categories, income_categories):
+        self._lists = {'expense': list(expense_categories), 'income': list(income_categories)}
+        self._lower = {t: {c.lower(): c for c in cats} for t, cats in self._lists.items()}
+        self._match = functools.lru_cache(maxsize=QUICK_ENTRY_MATCH_CACHE)(self._lookup)
+
+    def match_category(self, transaction_type, word):
+        return self._match(transaction_type, word.lower())
+
+    def _lookup(self, transaction_type, word):
+        lower = self._lower[transaction_type]
+        match = lower.get(word)
+        if match is None and len(word) >= 3:
+            prefixed = [name for name in lower if name.startswith(word)]
+            if len(prefixed) == 1:
+                match = lower[prefixed[0]]
+        if match is None:
+            close = difflib.get_close_matches(word, lower, n=1, cutoff=0.75)
+            match = lower[close[0]] if close else None
+        return match
+
+    # Function to parse one line into (amount, type, category, description)
+    def parse_line(self, line):
+        match = LINE_RE.match(line)
+        if match is None:
+            raise ValueError("expected <amount> [category] [description]")
+        raw_amount = match.group('amount')
+        amount = raw_amount.replace(',', '')
+        if not GROUPED_AMOUNT_RE.match(raw_amount):
+            raise ValueError(f"invalid amount {raw_amount!r} (misplaced commas)")
+        if not AMOUNT_RE.match(amount):
+            raise ValueError(f"invalid amount {raw_amount!r} (at most two decimals)")
+        if Decimal(amount) == 0:
+            raise ValueError("amount must be more than 0")
+        if Decimal(amount) > MAX_AMOUNT:
+            raise ValueError(f"amount must be at most {MAX_AMOUNT:,}")
+
+        transaction_type = 'income' if match.group('sign') else 'expense'
+        word, rest = match.group('word'), match.group('rest') or ''
+        category = self.match_category(transaction_type, word) if word else None
+        if category is None:
+            if not (match.group('currency') or match.group('sign')):
+                raise ValueError(f"unknown category {word!r}" if word else "no category given")
+            category = 'Other'
+            rest = f"{word} {rest}".strip() if word else rest
+        return amount, transaction_type, category, rest[:255]
+
+    # Function to check whether a message is meant as a quick entry: its first
+    # line is an amount followed by a known category, or a marked amount.
+    # Ordinary chatter is ignored instead of answered with errors; a mistyped
+    # amount in an entry is still reported by parse().
+    def is_entry(self, text):
+        first = next((line for line in (text or '').splitlines() if line.strip()), None)
+        match = LINE_RE.match(first) if first is not None else None
+        if match is None:
+            return False
+        if match.group('currency') or match.group('sign'):
+            return True
+        word = match.group('word')
+        return bool(word) and self.match_category('expense', word) is not None
+
+    # Function to parse a whole message, one transaction per non-empty line.
+    # Returns (rows, errors); errors are "line N: reason" messages.
+    def parse(self, text, username, timestamp=None):
+        timestamp = timestamp or datetime.now()
+        lines = [line for line in text.splitlines() if line.strip()]
+        if len(lines) > QUICK_ENTRY_MAX_LINES:
+            return [], [f"at most {QUICK_ENTRY_MAX_LINES} lines per message, got {len(lines)}"]
+        rows, errors = [], []
+        for number, line in enumerate(lines, start=1):
+            try:
+                amount, transaction_type, category, description = self.parse_line(line)
+            except ValueError as exc:
+                errors.append(f"line {number}: {exc}")
+                continue
+            rows.append((amount, transaction_type, category, description, username, timestamp))
+        return rows, errors
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cache settings
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '512'))   # Max cached results (LRU)
+REPORT_CACHE_TTL = float(os.getenv('REPORT_CACHE_TTL', '300'))   # Seconds before a result expires
+
+
+# LRU + TTL cache for report query results.
+# Keys are (scope, start_date, end_date, kind) where scope is a username, or
+# None for reports over all users. A write for user U on day D drops every
+# entry whose scope is U or None and whose range contains D.
+class ReportCache:
+    def __init__(self, max_entries=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a query that raced with a write
+        # does not put its (possibly stale) result back into the cache.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user, day):
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key in self._entries
+                if key[0] in (None, user) and key[1] <= day <= key[2]
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+report_cache = ReportCache()
+
+# Function to return a cached result, or run the query and cache it
+def cached(key, query):
+    found, value = report_cache.get(key)
+    if found:
+        return value
+    generation = report_cache.generation
+    value = query()
+    report_cache.put(key, value, generation)
+    return value
@@ -0,0 +1,48 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Rough process start: this module is imported first thing by main.py
+PROCESS_STARTED = time.perf_counter()
+
+
+# Records how long each startup stage takes and how long it takes until the
+# bot is ready and until the first update has been handled, so cold start
+# and time-to-first-reply can be tracked across releases.
+class StartupTimer:
+    def __init__(self, started=PROCESS_STARTED):
+        self.started = started
+        self.stages = []           # (stage name, seconds)
+        self.ready_after = None
+        self.first_update_after = None
+
+    @contextmanager
+    def stage(self, name):
+        stage_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - stage_started
+            self.stages.append((name, elapsed))
+            logger.info("Startup stage %-18s %8.1f ms", name, elapsed * 1000)
+
+    # Function to record a stage that began at process start (e.g. imports)
+    def record_since_start(self, name):
+        elapsed = time.perf_counter() - self.started
+        self.stages.append((name, elapsed))
+        logger.info("Startup stage %-18s %8.1f ms", name, elapsed * 1000)
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        logger.info("Bot ready %.1f ms after process start", self.ready_after * 1000)
+
+    # Handler for group -1: runs before the real handlers, logs only once
+    async def first_update(self, update, context):
+        if self.first_update_after is None:
+            self.first_update_after = time.perf_counter() - self.started
+            logger.info("First update received %.1f ms after process start", self.first_update_after * 1000)
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,1011 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+# Connection pool settings (MariaDB)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))            # Max open connections
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))   # Seconds to wait for a free connection
+DB_POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', '1800')) # Close connections idle longer than this
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))  # Health check connections idle longer than this
+
+# SQLite settings
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'finance_tracker.db')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+
+# Function to turn an inclusive date range into a half-open timestamp range.
+# Comparing the bare column (instead of DATE(timestamp)) lets the indexes be used.
+def period_bounds(start_date, end_date):
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    return start, end
+
+def _to_decimal(value):
+    return Decimal(str(value)).quantize(CENT)
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+# Storage interface used by db.py.
+# Queries are written once with %s placeholders; backends provide the
+# connections, the dialect specific DDL and the daily_totals upsert.
+class Storage:
+    name = None
+
+    # Dialect specific SQL, filled in by the backends
+    TABLES = []
+    DAILY_TOTALS_DDL = []
+    UPSERT_DAILY_TOTALS = None
+    supports_rollup = False
+
+    SCHEMA_VERSION_TABLE = """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+    ROLLUP_SELECT = """
+        SELECT COALESCE(user, ''), DATE(timestamp), type, COALESCE(category, ''), SUM(amount), COUNT(*)
+        FROM transactions
+        WHERE timestamp >= %s AND timestamp < %s
+        GROUP BY 1, 2, 3, 4
+    """
+
+    @contextmanager
+    def connection(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _sql(self, query):
+        return query
+
+    # Function to build an INSERT that replaces `update_columns` when a row
+    # with the same `key_columns` already exists
+    def _upsert_sql(self, table, columns, key_columns, update_columns):
+        raise NotImplementedError
+
+    # Cursor for iter_transactions; sqlite3 cursors already step through results lazily
+    def _stream_cursor(self, conn):
+        return conn.cursor()
+
+    # Connection for iter_transactions. The body only completes when the
+    # result was read to the end; otherwise the generator was closed early or
+    # failed mid-result.
+    @contextmanager
+    def _stream_connection(self):
+        with self.connection() as conn:
+            yield conn
+
+    # Closes a _stream_cursor, also when the caller stopped reading early
+    def _close_stream(self, cursor, exhausted):
+        cursor.close()
+
+    def _execute(self, cursor, query, params=()):
+        cursor.execute(self._sql(query), params)
+
+    def _executemany(self, cursor, query, rows):
+        cursor.executemany(self._sql(query), rows)
+
+    # Versioned schema migrations, applied in order and recorded in schema_version
+    def migrations(self):
+        return [
+            (1, "Index transactions for per-user and period range scans", [
+                "CREATE INDEX IF NOT EXISTS idx_transactions_user_ts ON transactions (user, timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_transactions_ts_category ON transactions (timestamp, category)",
+            ]),
+            (2, "Add daily_totals rollup and backfill it from transactions", self.DAILY_TOTALS_DDL + [
+                lambda connection: self.rebuild_daily_totals(connection=connection),
+            ]),
+            (3, "Index transactions for (timestamp, id) keyset pagination", [
+                "CREATE INDEX IF NOT EXISTS idx_transactions_ts_id ON transactions (timestamp, id)",
+            ]),
+            (4, "Add bot_user_data and bot_conversations for bot persistence", [
+                """
+                CREATE TABLE IF NOT EXISTS bot_user_data (
+                    user_id BIGINT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """,
+                """
+                CREATE TABLE IF NOT EXISTS bot_conversations (
+                    name VARCHAR(64) NOT NULL,
+                    conv_key VARCHAR(128) NOT NULL,
+                    state TEXT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (name, conv_key)
+                );
+                """,
+                "CREATE INDEX IF NOT EXISTS idx_bot_conversations_updated ON bot_conversations (name, updated_at)",
+            ]),
+            (5, "Add digest_subscriptions for scheduled digests", [
+                """
+                CREATE TABLE IF NOT EXISTS digest_subscriptions (
+                    chat_id BIGINT PRIMARY KEY,
+                    username VARCHAR(50) NOT NULL,
+                    frequency VARCHAR(10) NOT NULL,
+                    send_minute INT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+                """,
+                "CREATE INDEX IF NOT EXISTS idx_digest_subscriptions_minute ON digest_subscriptions (send_minute)",
+            ]),
+            (6, "Add user_categories for per-user and per-group categories", [
+                """
+                CREATE TABLE IF NOT EXISTS user_categories (
+                    owner_id BIGINT NOT NULL,
+                    type VARCHAR(10) NOT NULL,
+                    name VARCHAR(50) NOT NULL,
+                    position INT NOT NULL,
+                    archived SMALLINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (owner_id, type, name)
+                );
+                """,
+            ]),
+        ]
+
+    @property
+    def latest_version(self):
+        return max(version for version, _, _ in self.migrations())
+
+    # Function to return the recorded schema version (0 if there is none yet)
+    def schema_version(self):
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._execute(cursor, "SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                version = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+            connection.commit()
+        return version
+
+    # Function to bring the schema up to date. A database already at the
+    # latest version costs one SELECT; DDL only runs when something is missing.
+    def ensure_schema(self):
+        try:
+            if self.schema_version() >= self.latest_version:
+                return False
+        except Exception:
+            # Missing schema_version table; connection problems resurface below
+            logger.info("No schema_version table yet; creating schema")
+        self.create_schema()
+        return True
+
+    # Function to create the base tables and apply pending migrations
+    def create_schema(self):
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for statement in self.TABLES:
+                    self._execute(cursor, statement)
+                connection.commit()
+            finally:
+                cursor.close()
+            self.run_migrations(connection)
+
+    # Function to apply any migrations newer than the recorded schema version
+    def run_migrations(self, connection):
+        cursor = connection.cursor()
+        try:
+            self._execute(cursor, self.SCHEMA_VERSION_TABLE)
+            self._execute(cursor, "SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current_version = cursor.fetchone()[0]
+
+            for version, description, statements in self.migrations():
+                if version <= current_version:
+                    continue
+                logger.info("Applying schema migration %s: %s", version, description)
+                for statement in statements:
+                    if callable(statement):
+                        statement(connection)
+                    else:
+                        self._execute(cursor, statement)
+                self._execute(
+                    cursor,
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                connection.commit()
+        finally:
+            cursor.close()
+
+    # Function to save a batch of (amount, type, category, description, user, timestamp)
+    # rows with one executemany and one commit. The daily_totals rollup is updated
+    # in the same transaction, pre-aggregated so each rollup key is written once.
+    # Returns the (user, day) pairs that were written.
+    def save_many(self, rows):
+        # Timestamps are stored with second precision on every backend
+        rows = [row[:5] + (row[5].replace(microsecond=0),) for row in rows]
+        rollup = {}
+        for amount, transaction_type, category, _, username, timestamp in rows:
+            key = (username or '', timestamp.date(), transaction_type, category or '')
+            total, count = rollup.get(key, (Decimal('0'), 0))
+            rollup[key] = (total + Decimal(str(amount)), count + 1)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._executemany(
+                    cursor,
+                    "INSERT INTO transactions (amount, type, category, description, user, timestamp) VALUES (%s, %s, %s, %s, %s, %s)",
+                    rows
+                )
+                self._executemany(cursor, self.UPSERT_DAILY_TOTALS, [key + value for key, value in rollup.items()])
+                conn.commit()
+            finally:
+                cursor.close()
+        return {(username, day) for username, day, _, _ in rollup}
+
+    def transactions_by_period(self, start_date, end_date):
+        query = """
+            SELECT amount, type, category, user, timestamp, description
+            FROM transactions
+            WHERE timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp ASC
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query, period_bounds(start_date, end_date))
+                result = cursor.fetchall()
+            finally:
+                cursor.close()
+            # Close the read snapshot so the connection sees new rows next time
+            conn.commit()
+        return result
+
+    # Function to get one page of transactions using a (timestamp, id) keyset.
+    # `after` / `before` is the (timestamp, id) of the row the page continues from,
+    # so deep pages cost the same as the first one (no OFFSET scan).
+    # Returns (rows, has_more) where rows are
+    # (id, amount, type, category, user, timestamp, description) in ascending order
+    # and has_more tells whether more rows exist beyond the page in that direction.
+    def transactions_page(self, start_date, end_date, after=None, before=None, page_size=20, username=None):
+        query = """
+            SELECT id, amount, type, category, user, timestamp, description
+            FROM transactions
+            WHERE timestamp >= %s AND timestamp < %s
+        """
+        params = list(period_bounds(start_date, end_date))
+        if username is not None:
+            query += " AND user = %s"
+            params.append(username)
+        if before is not None:
+            query += " AND (timestamp < %s OR (timestamp = %s AND id < %s)) ORDER BY timestamp DESC, id DESC"
+            params += [before[0], before[0], before[1]]
+        else:
+            if after is not None:
+                query += " AND (timestamp > %s OR (timestamp = %s AND id > %s))"
+                params += [after[0], after[0], after[1]]
+            query += " ORDER BY timestamp ASC, id ASC"
+        query += " LIMIT %s"
+        params.append(page_size + 1)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if before is not None:
+            rows.reverse()
+        return rows, has_more
+
+    # Function to get a number that changes whenever transactions are added.
+    # Transactions are only ever inserted, so the highest id is enough, and it
+    # is read from the end of the primary key without scanning the table.
+    def data_version(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, "SELECT MAX(id) FROM transactions")
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+            conn.commit()
+        return row[0] or 0
+
+    # Function to stream one user's transactions for a period in (timestamp, id)
+    # order, yielding lists of up to fetch_size
+    # (timestamp, amount, type, category, description) rows. The cursor comes
+    # from _stream_cursor, so rows are pulled from the server as they are
+    # consumed instead of being buffered. It is a plain non-locking read, so
+    # concurrent inserts are not blocked while an export runs.
+    def iter_transactions(self, username, start_date, end_date, fetch_size=1000):
+        query = """
+            SELECT timestamp, amount, type, category, description
+            FROM transactions
+            WHERE user = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp ASC, id ASC
+        """
+        with self._stream_connection() as conn:
+            cursor = self._stream_cursor(conn)
+            exhausted = False
+            try:
+                self._execute(cursor, query, (username, *period_bounds(start_date, end_date)))
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        exhausted = True
+                        break
+                    yield rows
+            finally:
+                self._close_stream(cursor, exhausted)
+            conn.commit()
+
+    # Function to get per-category totals for a period from the daily_totals rollup.
+    # Returns ([(category, Decimal total), ...], Decimal grand total). Where the
+    # database supports it the grand total is the WITH ROLLUP row, whose group
+    # key is NULL; otherwise it is summed from the per-category rows.
+    def category_totals(self, start_date, end_date, transaction_type=None):
+        query = """
+            SELECT category, SUM(total)
+            FROM daily_totals
+            WHERE day >= %s AND day <= %s
+        """
+        params = [start_date, end_date]
+        if transaction_type is not None:
+            query += " AND type = %s"
+            params.append(transaction_type)
+        query += " GROUP BY category"
+        if self.supports_rollup:
+            query += " WITH ROLLUP"
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+
+        totals = []
+        grand_total = None
+        for category, total in rows:
+            if category is None:
+                grand_total = _to_decimal(total)
+            else:
+                totals.append((category or 'Uncategorized', _to_decimal(total)))
+        if grand_total is None:
+            grand_total = sum((total for _, total in totals), Decimal('0.00'))
+        return totals, grand_total
+
+    # Function to read a period for analytics.py as
+    # (amount in minor units, row count, type, category, user, day) rows.
+    # Amounts are converted to integer cents by the database, so no Decimal
+    # objects are built per row. With rollup=True the rows come from
+    # daily_totals (one per user/day/type/category) instead of transactions.
+    def period_columns(self, start_date, end_date, username=None, rollup=False):
+        if rollup:
+            query = f"""
+                SELECT {self.MINOR_UNITS_SQL.format('total')}, txn_count, type, category, user, day
+                FROM daily_totals
+                WHERE day >= %s AND day <= %s
+            """
+            params = [start_date, end_date]
+        else:
+            query = f"""
+                SELECT {self.MINOR_UNITS_SQL.format('amount')}, 1, type, category, user, DATE(timestamp)
+                FROM transactions
+                WHERE timestamp >= %s AND timestamp < %s
+            """
+            params = list(period_bounds(start_date, end_date))
+        if username is not None:
+            query += " AND user = %s"
+            params.append(username)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+        return rows
+
+    # Function to recompute daily_totals from raw transactions, one chunk of days
+    # per database transaction. With verify=True nothing is written and the days
+    # whose stored rollup differs from the raw rows are returned instead.
+    def rebuild_daily_totals(self, chunk_days=31, verify=False, connection=None):
+        if connection is None:
+            with self.connection() as conn:
+                return self.rebuild_daily_totals(chunk_days, verify, connection=conn)
+
+        cursor = connection.cursor()
+        mismatched_days = set()
+        try:
+            self._execute(cursor, "SELECT MIN(timestamp), MAX(timestamp) FROM transactions")
+            first, last = cursor.fetchone()
+            if first is None:
+                if not verify:
+                    self._execute(cursor, "DELETE FROM daily_totals")
+                connection.commit()
+                return []
+
+            first_day, last_day = _to_datetime(first).date(), _to_datetime(last).date()
+            if not verify:
+                self._execute(cursor, "DELETE FROM daily_totals WHERE day < %s OR day > %s", (first_day, last_day))
+                connection.commit()
+
+            chunk_start = first_day
+            while chunk_start <= last_day:
+                chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), last_day)
+                bounds = period_bounds(chunk_start, chunk_end)
+                if verify:
+                    self._execute(cursor, self.ROLLUP_SELECT, bounds)
+                    expected = {
+                        (row[0], _to_date(row[1]), row[2], row[3]): (_to_decimal(row[4]), row[5])
+                        for row in cursor.fetchall()
+                    }
+                    self._execute(
+                        cursor,
+                        "SELECT user, day, type, category, total, txn_count FROM daily_totals WHERE day >= %s AND day <= %s",
+                        (chunk_start, chunk_end)
+                    )
+                    stored = {
+                        (row[0], _to_date(row[1]), row[2], row[3]): (_to_decimal(row[4]), row[5])
+                        for row in cursor.fetchall()
+                    }
+                    for key in expected.keys() | stored.keys():
+                        if expected.get(key) != stored.get(key):
+                            mismatched_days.add(key[1])
+                else:
+                    self._execute(cursor, "DELETE FROM daily_totals WHERE day >= %s AND day <= %s", (chunk_start, chunk_end))
+                    self._execute(
+                        cursor,
+                        "INSERT INTO daily_totals (user, day, type, category, total, txn_count)" + self.ROLLUP_SELECT,
+                        bounds
+                    )
+                connection.commit()
+                logger.info("daily_totals %s %s..%s", "verified" if verify else "rebuilt", chunk_start, chunk_end)
+                chunk_start = chunk_end + timedelta(days=1)
+        finally:
+            cursor.close()
+        return sorted(mismatched_days)
+
+    # Function to load one user's persisted user_data (JSON text), or None
+    def load_user_state(self, user_id):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, "SELECT data FROM bot_user_data WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+            conn.commit()
+        return row[0] if row else None
+
+    # Function to load a conversation's states updated since `since`
+    # as [(conv_key JSON, state JSON), ...]
+    def load_conversations(self, name, since):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(
+                    cursor,
+                    "SELECT conv_key, state FROM bot_conversations WHERE name = %s AND updated_at >= %s",
+                    (name, since)
+                )
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+        return rows
+
+    # Function to write a batch of bot state changes in one transaction:
+    # user_rows [(user_id, data JSON)], dropped_user_ids [user_id],
+    # conversation_rows [(name, conv_key JSON, state JSON or None to delete)]
+    def save_bot_state(self, user_rows, dropped_user_ids, conversation_rows):
+        now = datetime.now().replace(microsecond=0)
+        upsert_user = self._upsert_sql('bot_user_data', ['user_id', 'data', 'updated_at'], ['user_id'], ['data', 'updated_at'])
+        upsert_conversation = self._upsert_sql(
+            'bot_conversations', ['name', 'conv_key', 'state', 'updated_at'], ['name', 'conv_key'], ['state', 'updated_at']
+        )
+        ended = [(name, key) for name, key, state in conversation_rows if state is None]
+        active = [(name, key, state, now) for name, key, state in conversation_rows if state is not None]
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if user_rows:
+                    self._executemany(cursor, upsert_user, [(user_id, data, now) for user_id, data in user_rows])
+                if dropped_user_ids:
+                    self._executemany(cursor, "DELETE FROM bot_user_data WHERE user_id = %s", [(i,) for i in dropped_user_ids])
+                if active:
+                    self._executemany(cursor, upsert_conversation, active)
+                if ended:
+                    self._executemany(cursor, "DELETE FROM bot_conversations WHERE name = %s AND conv_key = %s", ended)
+                conn.commit()
+            finally:
+                cursor.close()
+
+    # Function to subscribe a chat to digests (replaces its previous subscription).
+    # send_minute is the local send time as minutes after midnight.
+    def save_digest_subscription(self, chat_id, username, frequency, send_minute):
+        upsert = self._upsert_sql(
+            'digest_subscriptions', ['chat_id', 'username', 'frequency', 'send_minute', 'updated_at'],
+            ['chat_id'], ['username', 'frequency', 'send_minute', 'updated_at']
+        )
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, upsert, (chat_id, username, frequency, send_minute, datetime.now().replace(microsecond=0)))
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def delete_digest_subscription(self, chat_id):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, "DELETE FROM digest_subscriptions WHERE chat_id = %s", (chat_id,))
+                deleted = cursor.rowcount
+                conn.commit()
+            finally:
+                cursor.close()
+        return deleted > 0
+
+    # Function to list digest subscriptions as (chat_id, username, frequency, send_minute),
+    # either one chat's or those with first_minute <= send_minute < end_minute
+    def digest_subscriptions(self, first_minute=0, end_minute=24 * 60, chat_id=None):
+        query = "SELECT chat_id, username, frequency, send_minute FROM digest_subscriptions"
+        if chat_id is not None:
+            query += " WHERE chat_id = %s"
+            params = (chat_id,)
+        else:
+            query += " WHERE send_minute >= %s AND send_minute < %s"
+            params = (first_minute, end_minute)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+        return rows
+
+    # Function to total a period for many users in one grouped daily_totals
+    # read: [(user, type, category, amount in minor units, transaction count), ...]
+    def user_totals(self, start_date, end_date, usernames, chunk_size=500):
+        usernames = list(dict.fromkeys(usernames))
+        rows = []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # IN lists are chunked to stay well under placeholder limits
+                for i in range(0, len(usernames), chunk_size):
+                    chunk = usernames[i:i + chunk_size]
+                    self._execute(cursor, f"""
+                        SELECT user, type, category, {self.MINOR_UNITS_SQL.format('SUM(total)')}, SUM(txn_count)
+                        FROM daily_totals
+                        WHERE day >= %s AND day <= %s AND user IN ({', '.join(['%s'] * len(chunk))})
+                        GROUP BY user, type, category
+                    """, [start_date, end_date] + chunk)
+                    rows.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+            conn.commit()
+        return rows
+
+    # Function to read every custom category list as
+    # (owner_id, type, name, position, archived) rows, in display order
+    def load_categories(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, """
+                    SELECT owner_id, type, name, position, archived
+                    FROM user_categories
+                    ORDER BY owner_id, type, position
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            conn.commit()
+        return rows
+
+    # Function to replace one owner's category lists with
+    # rows [(type, name, position, archived)] in one transaction
+    def replace_categories(self, owner_id, rows):
+        now = datetime.now().replace(microsecond=0)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, "DELETE FROM user_categories WHERE owner_id = %s", (owner_id,))
+                self._executemany(
+                    cursor,
+                    "INSERT INTO user_categories (owner_id, type, name, position, archived, updated_at) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    [(owner_id, t, name, position, int(archived), now) for t, name, position, archived in rows]
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+
+    # Create admin user if not exists
+    def create_admin_account(self):
+        query = "INSERT INTO users (userid, mobile, otp, otpexp) VALUES ('admin', '0', 'admin', NULL)"
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self._execute(cursor, query)
+                conn.commit()
+            finally:
+                cursor.close()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Bounded pool of database connections shared by all handlers.
+# Idle connections are reused LIFO, health checked with a ping when they have
+# been idle for a while, and closed once they pass the recycle age.
+class ConnectionPool:
+    def __init__(self, factory, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER):
+        self._factory = factory
+        self.size = size
+        self._timeout = timeout
+        self._recycle = recycle
+        self._ping_after = ping_after
+        self._idle = queue.LifoQueue()  # (connection, last_used)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise PoolTimeout(f"No database connection available after {self._timeout}s")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            self.in_use -= 1
+        try:
+            if discard:
+                self._close_quietly(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(conn)
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._factory()
+
+            idle_for = time.monotonic() - last_used
+            if idle_for > self._recycle:
+                self._close_quietly(conn)
+                continue
+            if idle_for > self._ping_after and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                continue
+            return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            logger.debug("Error while closing pooled connection", exc_info=True)
+
+
+# MariaDB / MySQL backend, used by the Docker Compose deployment
+class MariaDBStorage(Storage):
+    name = 'mariadb'
+    supports_rollup = True
+
+    TABLES = [
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            amount DECIMAL(10, 2) NOT NULL,
+            type ENUM('income', 'expense') NOT NULL,
+            category VARCHAR(50),
+            description TEXT,
+            user VARCHAR(50),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            userid VARCHAR(15),
+            mobile BIGINT,
+            otp VARCHAR(15),
+            otpexp TIMESTAMP NULL,
+            UNIQUE (mobile, userid)
+        );
+        """,
+    ]
+
+    DAILY_TOTALS_DDL = [
+        """
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            user VARCHAR(50) NOT NULL DEFAULT '',
+            day DATE NOT NULL,
+            type ENUM('income', 'expense') NOT NULL,
+            category VARCHAR(50) NOT NULL DEFAULT '',
+            total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            txn_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user, day, type, category),
+            KEY idx_daily_totals_day (day, category)
+        );
+        """,
+    ]
+
+    UPSERT_DAILY_TOTALS = """
+        INSERT INTO daily_totals (user, day, type, category, total, txn_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total), txn_count = txn_count + VALUES(txn_count)
+    """
+
+    MINOR_UNITS_SQL = "CAST({} * 100 AS SIGNED)"
+
+    def __init__(self, host=None, user=None, password=None, database=None, pool_size=DB_POOL_SIZE):
+        self._config = {
+            'host': host or os.getenv('DB_HOST', 'mariadb'),  # Database service name in Docker Compose
+            'user': user or os.getenv('DB_USER', 'root'),
+            'password': password if password is not None else os.getenv('DB_PASSWORD'),
+            'database': database or os.getenv('DB_NAME', 'finance_tracker'),
+        }
+        self.pool = ConnectionPool(self.connect, size=pool_size)
+
+    # Function to get a new (unpooled) connection to the MariaDB database
+    def connect(self):
+        import mysql.connector
+        return mysql.connector.connect(**self._config)
+
+    def connection(self):
+        return self.pool.connection()
+
+    # Unbuffered cursor: rows stay on the server until fetched
+    def _stream_cursor(self, conn):
+        return conn.cursor(buffered=False)
+
+    # A connection left mid-result by an unbuffered cursor ("Unread result
+    # found") cannot be reused, and reading the rest of a large export just to
+    # drop it could take long, so an unfinished stream's connection is
+    # discarded instead of being returned to the pool
+    @contextmanager
+    def _stream_connection(self):
+        conn = self.pool.acquire()
+        discard = True
+        try:
+            yield conn
+            discard = False
+        finally:
+            self.pool.release(conn, discard=discard)
+
+    # Closing a cursor with unread rows raises; that error is dropped so the
+    # one that stopped the stream (if any) is the one reported
+    def _close_stream(self, cursor, exhausted):
+        if exhausted:
+            cursor.close()
+            return
+        try:
+            cursor.close()
+        except Exception:
+            logger.debug("Ignoring error closing an unfinished export cursor", exc_info=True)
+
+    def _upsert_sql(self, table, columns, key_columns, update_columns):
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {', '.join(f'{c} = VALUES({c})' for c in update_columns)}"
+        )
+
+    def close(self):
+        self.pool.close()
+
+
+# SQLite backend for local runs, benchmarks and small single-user deployments.
+# Each thread gets its own connection; WAL lets readers run alongside the
+# single writer, and busy_timeout makes concurrent writers wait instead of fail.
+class SQLiteStorage(Storage):
+    name = 'sqlite'
+
+    PRAGMAS = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",         # Durable at checkpoints; no fsync per commit in WAL mode
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -32000",          # 32 MB page cache per connection
+        "PRAGMA mmap_size = 268435456",        # Map up to 256 MB of the file
+        "PRAGMA foreign_keys = ON",
+    ]
+
+    TABLES = [
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount DECIMAL(10, 2) NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+            category VARCHAR(50),
+            description TEXT,
+            user VARCHAR(50),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            userid VARCHAR(15),
+            mobile BIGINT,
+            otp VARCHAR(15),
+            otpexp TIMESTAMP NULL,
+            UNIQUE (mobile, userid)
+        );
+        """,
+    ]
+
+    DAILY_TOTALS_DDL = [
+        """
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            user VARCHAR(50) NOT NULL DEFAULT '',
+            day DATE NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+            category VARCHAR(50) NOT NULL DEFAULT '',
+            total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            txn_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user, day, type, category)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_daily_totals_day ON daily_totals (day, category)",
+    ]
+
+    UPSERT_DAILY_TOTALS = """
+        INSERT INTO daily_totals (user, day, type, category, total, txn_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user, day, type, category)
+        DO UPDATE SET total = total + excluded.total, txn_count = txn_count + excluded.txn_count
+    """
+
+    # Decimals are stored as numbers, so round away binary fractions
+    MINOR_UNITS_SQL = "CAST(ROUND({} * 100) AS INTEGER)"
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_PATH
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        )
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def _sql(self, query):
+        return query.replace('%s', '?')
+
+    def _upsert_sql(self, table, columns, key_columns, update_columns):
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in update_columns)}"
+        )
+
+
+# Store dates, timestamps and amounts in SQLite as text and read them back as
+# the same Python types mysql.connector returns.
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DECIMAL', lambda value: _to_decimal(value.decode()))
+
+
+BACKENDS = {
+    'mariadb': MariaDBStorage,
+    'mysql': MariaDBStorage,
+    'sqlite': SQLiteStorage,
+}
+
+# Function to create the storage backend named by DB_BACKEND (mariadb or sqlite)
+def create_storage(backend=None, **kwargs):
+    backend = (backend or os.getenv('DB_BACKEND', 'mariadb')).lower()
+    try:
+        return BACKENDS[backend](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown DB_BACKEND {backend!r}; expected one of {', '.join(sorted(BACKENDS))}") from None
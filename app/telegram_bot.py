@@ -1,14 +1,16 @@
 import importlib
 import os
-from dotenv import load_dotenv
 
 #Version = "1_0"
 Version = os.getenv("BOT_VERSION", "1_0")
 
-# Load environment variables from .env file
-module = importlib.import_module(f"telegram_bot_v{Version}")
+# Function to import the handler module for BOT_VERSION (or `version`)
+def load_handlers(version=None):
+    return importlib.import_module(f"telegram_bot_v{version or Version}")
 
-# Automatically expose all non-private attributes from the module
-for attr in dir(module):
-    if not attr.startswith("_"):  # Skip private/internal names
-        globals()[attr] = getattr(module, attr)
\ No newline at end of file
+# Attribute access (telegram_bot.start, ...) is forwarded to the versioned
+# module on first use instead of copying its namespace at import time
+def __getattr__(name):
+    if name.startswith("_"):
+        raise AttributeError(name)
+    return getattr(load_handlers(), name)
@@ -1,17 +1,31 @@
-from db import get_transactions_by_period
+from db import get_transactions_page_async, get_category_totals_async
 from datetime import datetime, timedelta
+from decimal import Decimal
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     CommandHandler, ConversationHandler,
     MessageHandler, CallbackQueryHandler, filters, CallbackContext
 )
-from db import save_data_to_db
-from collections import defaultdict
+from db import save_data_to_db_async, run_db, save_many_to_db
+from csv_import import CsvImporter, CsvImportError
+from categories import category_cache
+from analytics import load_ledger, to_decimal
+from charts import chart_renderer
+from export import EXPORT_FORMATS, EXPORT_SPOOL_BYTES, export_filename, export_transactions
+import asyncio
+import logging
+import os
 import re
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
 
 # Define categories
 INCOME_CATEGORIES = ['Salary', 'Investment', 'Bonus', 'Other']
 EXPENSE_CATEGORIES = ['Food', 'Utilities', 'Shopping', 'Medical', 'Travel', 'Groceries', 'Entertainment', 'Investments', 'Other']
+# Used for chats that have not set up their own categories (see /categories)
+category_cache.set_defaults(EXPENSE_CATEGORIES, INCOME_CATEGORIES)
 
 # Define stages
 #START, AMOUNT, TYPE, CATEGORY, DESCRIPTION = range(5)
@@ -26,8 +40,14 @@ async def help_command(update: Update, context: CallbackContext) -> None:
         "• /today – Show Today's transaction\n"
         "• /week – Show This Week's transaction\n"
         "• /month – Show This Month's transaction\n"
+        "• /report [from] [to] [by day|week|month|category] – Expense report for any period\n"
+        "• /export [from] [to] [csv|jsonl] – Download your transactions\n"
+        "• /categories – List and edit your categories\n"
+        "• /digest daily|weekly HH:MM – Get a spending digest automatically (/digest off to stop)\n"
         "• /cancel – Cancel the current transaction\n"
-        "• /help – Show this help message\n\n"
+        "• /help – Show this help message\n"
+        "• Send a CSV file – Import past transactions\n"
+        "• Send `250 food lunch` – Save an expense in one message (one per line, `+` for income)\n\n"
         "You’ll be guided step-by-step to record either income or Expense.\n"
         "Just follow the prompts. ✅",
         parse_mode="Markdown"
@@ -97,13 +117,11 @@ async def amount(update: Update, context: CallbackContext) -> int:
     context.user_data['amount'] = user_input
     context.user_data['type'] = 'expense'  # Force set type to expense
 
-    # Show category options directly
-    buttons = [[InlineKeyboardButton(cat, callback_data=cat)] for cat in EXPENSE_CATEGORIES]
-
+    # Show category options directly (the chat's keyboard is prebuilt and cached)
     await update.message.reply_text(
         "📂 Please select a category:\n👉 Type /cancel to stop.",
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=category_cache.keyboard(update.effective_chat.id)
     )
     return CATEGORY
 
@@ -177,7 +195,7 @@ async def description(update: Update, context: CallbackContext) -> int:
     data = context.user_data
 
     username = update.message.from_user.username or update.message.from_user.full_name
-    save_data_to_db(
+    await save_data_to_db_async(
         data['amount'], data['type'], data['category'], data['description'], username
     )
 
@@ -199,6 +217,38 @@ async def description(update: Update, context: CallbackContext) -> int:
 
     return ConversationHandler.END
 
+# Quick entry: "250 food lunch with team", one transaction per line, saved in
+# one batch. Runs for text outside the /start conversation.
+async def quick_entry(update: Update, context: CallbackContext) -> None:
+    text = update.message.text or ''
+    parser = category_cache.parser(update.effective_chat.id)
+    if not parser.is_entry(text):
+        return
+
+    user = update.message.from_user
+    username = user.username or user.full_name
+    rows, errors = parser.parse(text, username)
+    if errors:
+        # Nothing is saved, so the corrected message can simply be sent again
+        await update.message.reply_text(
+            "❌ Nothing saved:\n" + "\n".join(errors[:10]) +
+            "\n\nFormat: <amount> <category> [description], e.g. 250 food lunch with team"
+            "\n(₹45 coffee saves to Other)"
+        )
+        return
+
+    try:
+        await run_db(save_many_to_db, rows)
+    except Exception:
+        logger.exception("Quick entry of %s rows for %s failed", len(rows), username)
+        await update.message.reply_text("❌ Could not save these transactions. Please try again later.")
+        return
+    lines = [f"• {'+' if t == 'income' else ''}₹{Decimal(amount):,.2f} {category}" + (f" – {desc}" if desc else "")
+             for amount, t, category, desc, _, _ in rows]
+    if len(rows) > 1:
+        lines.append(f"Total: ₹{sum(Decimal(row[0]) for row in rows if row[1] == 'expense'):,.2f} spent")
+    await update.message.reply_text(f"✅ Saved {len(rows)} transaction{'s' if len(rows) > 1 else ''}:\n" + "\n".join(lines))
+
 # Format Table for printing reports
 def format_transactions_table(records):
     if not records:
@@ -212,27 +262,367 @@ def format_transactions_table(records):
 
     return "\n".join(lines)
 
+# Paginated reports.
+# Each page is fetched with a (timestamp, id) keyset; the Prev/Next buttons
+# carry the report kind, period, page number and the cursor row in their
+# callback data: pg|<kind>|<n or p>|<page>|<start>|<end>|<timestamp>|<id>
+REPORT_TITLES = {
+    't': "Today's Transactions",
+    'w': "This Week's Transactions",
+    'm': "This Month's Transactions",
+}
+PAGE_DATE_FORMAT = '%Y%m%d'
+PAGE_CURSOR_FORMAT = '%Y%m%d%H%M%S'
+
+def _page_button(label, kind, direction, page, start, end, row):
+    callback_data = "|".join([
+        'pg', kind, direction, str(page),
+        start.strftime(PAGE_DATE_FORMAT), end.strftime(PAGE_DATE_FORMAT),
+        row[5].strftime(PAGE_CURSOR_FORMAT), str(row[0]),
+    ])
+    return InlineKeyboardButton(label, callback_data=callback_data)
+
+async def _report_page(kind, start, end, page=1, after=None, before=None):
+    rows, has_more = await get_transactions_page_async(start, end, after=after, before=before)
+
+    # Going back always leaves rows after the page, and going forward always
+    # leaves rows before it; the other side is known from has_more.
+    has_prev = has_more if before is not None else after is not None
+    has_next = has_more if before is None else True
+
+    buttons = []
+    if rows and has_prev:
+        buttons.append(_page_button("⬅️ Prev", kind, 'p', page - 1, start, end, rows[0]))
+    if rows and has_next:
+        buttons.append(_page_button("Next ➡️", kind, 'n', page + 1, start, end, rows[-1]))
+
+    text = f"*{REPORT_TITLES[kind]}* (page {page}):\n\n```{format_transactions_table([r[1:] for r in rows])}```"
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def _send_report(update: Update, kind, start, end):
+    text, reply_markup = await _report_page(kind, start, end)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+
 # Handler to show Todays Records
 async def show_today(update: Update, context: CallbackContext):
     today = datetime.now().date()
-    records = get_transactions_by_period(today, today)
-    await update.message.reply_text(f"*Today's Transactions:*\n\n```{format_transactions_table(records)}```", parse_mode='Markdown')
+    await _send_report(update, 't', today, today)
 
 # Handler to show this Week Records
 async def show_week(update: Update, context: CallbackContext):
     today = datetime.now().date()
     start = today - timedelta(days=today.weekday())  # Monday
     end = today
-    records = get_transactions_by_period(start, end)
-    await update.message.reply_text(f"*This Week's Transactions:*\n\n```{format_transactions_table(records)}```", parse_mode='Markdown')
+    await _send_report(update, 'w', start, end)
 
 # Handler to show this Month Records
 async def show_month(update: Update, context: CallbackContext):
     today = datetime.now().date()
     start = today.replace(day=1)
     end = today
-    records = get_transactions_by_period(start, end)
-    await update.message.reply_text(f"*This Month's Transactions:*\n\n```{format_transactions_table(records)}```", parse_mode='Markdown')
+    await _send_report(update, 'm', start, end)
+
+# Prev/Next buttons on paginated reports
+async def report_page_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        _, kind, direction, page, start, end, timestamp, row_id = query.data.split("|")
+        start = datetime.strptime(start, PAGE_DATE_FORMAT).date()
+        end = datetime.strptime(end, PAGE_DATE_FORMAT).date()
+        row_cursor = (datetime.strptime(timestamp, PAGE_CURSOR_FORMAT), int(row_id))
+        page = int(page)
+    except ValueError:
+        kind = None
+    if kind not in REPORT_TITLES:
+        await query.edit_message_text("❌ Invalid selection.")
+        return
+
+    if direction == 'p':
+        text, reply_markup = await _report_page(kind, start, end, page, before=row_cursor)
+    else:
+        text, reply_markup = await _report_page(kind, start, end, page, after=row_cursor)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+
+# CSV import.
+# The file is downloaded to a temp file and read row by row in a worker thread;
+# each batch of IMPORT_BATCH_SIZE rows is saved in one transaction. Without a
+# type or debit/credit column, negative amounts are expenses and the rest income.
+IMPORT_PROGRESS_INTERVAL = 3  # Seconds between progress message edits
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024  # Bot API download limit
+_imports_running = set()  # User ids with an import in progress
+
+async def import_document(update: Update, context: CallbackContext):
+    document = update.message.document
+    user = update.message.from_user
+    username = user.username or user.full_name
+
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await update.message.reply_text("❌ The file is too large (max 20 MB). Please split it and send the parts.")
+        return
+    if user.id in _imports_running:
+        await update.message.reply_text("⏳ An import is already running. Please wait for it to finish.")
+        return
+    _imports_running.add(user.id)
+
+    try:
+        progress = await update.message.reply_text("📥 Importing transactions…")
+    except Exception:
+        # _run_import (which clears the flag) never starts
+        _imports_running.discard(user.id)
+        raise
+    # Run in the background so the user's other messages are not queued behind the import
+    context.application.create_task(_run_import(document, user.id, username, progress), update=update)
+
+async def _run_import(document, user_id, username, progress):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    batches = None
+    saved = 0
+    try:
+        file = await document.get_file()
+        await file.download_to_drive(path)
+
+        chat_id = progress.chat_id
+        importer = CsvImporter(
+            path, username, category_cache.categories(chat_id, 'expense'), category_cache.categories(chat_id, 'income')
+        )
+        batches = importer.batches()
+        last_progress = time.monotonic()
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            await run_db(save_many_to_db, batch)
+            saved += len(batch)
+            if time.monotonic() - last_progress >= IMPORT_PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                percent = 100 * importer.bytes_read // max(importer.bytes_total, 1)
+                await progress.edit_text(f"📥 Importing… {percent}% ({saved} rows saved)")
+
+        lines = [f"✅ Import finished: {saved} transactions saved."]
+        if importer.skipped:
+            lines.append(f"⚠️ {importer.skipped} rows skipped:")
+            lines.extend(f"• {error}" for error in importer.errors)
+            if importer.skipped > len(importer.errors):
+                lines.append("• …")
+        await progress.edit_text("\n".join(lines))
+    except CsvImportError as exc:
+        await progress.edit_text(f"❌ Could not import this file: {exc}")
+    except Exception:
+        logger.exception("CSV import for %s failed after %s rows", username, saved)
+        await progress.edit_text(f"❌ The import failed after {saved} transactions were saved. Please try again later.")
+    finally:
+        if batches is not None:
+            batches.close()
+        os.remove(path)
+        _imports_running.discard(user_id)
+
+# Date arguments for commands, e.g. /export 2025-01-01 2025-03-31
+COMMAND_DATE_FORMAT = '%Y-%m-%d'
+
+# Function to parse [from] [to] command arguments into an inclusive date range.
+# No dates means this month so far; only `from` means from then until today.
+def _parse_date_range(args):
+    today = datetime.now().date()
+    if len(args) > 2:
+        raise ValueError("too many dates")
+    start = datetime.strptime(args[0], COMMAND_DATE_FORMAT).date() if args else today.replace(day=1)
+    end = datetime.strptime(args[1], COMMAND_DATE_FORMAT).date() if len(args) > 1 else today
+    if start > end:
+        raise ValueError("start date is after end date")
+    return start, end
+
+# /export [from] [to] [csv|jsonl] – send the user's transactions as a file.
+# Rows are streamed from the database into a spooled temp file, so building
+# the export does not hold the range in memory. The upload itself does: PTB
+# reads a document fully into memory before sending it, so exports are capped
+# at the Bot API upload limit.
+MAX_EXPORT_FILE_SIZE = 50 * 1024 * 1024  # Bot API upload limit
+
+async def export_command(update: Update, context: CallbackContext):
+    args = list(context.args or [])
+    fmt = 'csv'
+    if args and args[-1].lower() in EXPORT_FORMATS:
+        fmt = args.pop().lower()
+    try:
+        start, end = _parse_date_range(args)
+    except ValueError:
+        await update.message.reply_text(
+            "Usage: /export [from] [to] [csv|jsonl]\n"
+            "Dates are YYYY-MM-DD, e.g. /export 2025-01-01 2025-03-31"
+        )
+        return
+
+    user = update.message.from_user
+    username = user.username or user.full_name
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as out:
+        count = await run_db(export_transactions, username, start, end, out, fmt)
+        if not count:
+            await update.message.reply_text(f"No transactions found between {start} and {end}.")
+            return
+        if out.tell() > MAX_EXPORT_FILE_SIZE:
+            await update.message.reply_text(
+                f"❌ That export is over {MAX_EXPORT_FILE_SIZE // (1024 * 1024)} MB, more than Telegram accepts. "
+                "Please export a shorter period, or use jsonl (compressed)."
+            )
+            return
+        out.seek(0)
+        # Bytes, not the file: an in-memory SpooledTemporaryFile has no name,
+        # which PTB's file loader cannot handle (it reads the whole file anyway)
+        await update.message.reply_document(
+            document=out.read(),
+            filename=export_filename(start, end, fmt),
+            caption=f"📤 {count} transactions from {start} to {end}",
+        )
+
+# Custom period reports.
+# Answered from the daily_totals rollup through analytics.Ledger, so a full
+# year costs about the same as a week. The buttons under a report switch its
+# grouping: rp|<start>|<end>|<grouping>
+REPORT_GROUPINGS = ('category', 'day', 'week', 'month')
+REPORT_MAX_LINES = 60  # Keeps the reply well under Telegram's 4096 characters
+
+def _report_presets(today):
+    last_month_end = today.replace(day=1) - timedelta(days=1)
+    quarter_start = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+    return [
+        ("Last month", last_month_end.replace(day=1), last_month_end),
+        ("This quarter", quarter_start, today),
+        ("Year to date", today.replace(month=1, day=1), today),
+    ]
+
+def _report_callback_data(start, end, grouping):
+    return "|".join(['rp', start.strftime(PAGE_DATE_FORMAT), end.strftime(PAGE_DATE_FORMAT), grouping])
+
+def _report_label(grouping, label):
+    if grouping == 'day':
+        return label.strftime('%Y-%m-%d %a')
+    if grouping == 'week':
+        return label.strftime('wk %Y-%m-%d')
+    if grouping == 'month':
+        return label.strftime('%b %Y')
+    return str(label)
+
+async def _custom_report(start, end, grouping):
+    ledger = await run_db(load_ledger, start, end)
+    expenses = ledger.filter(transaction_type='expense')
+    income = ledger.filter(transaction_type='income').total()
+    groups = expenses.group_by(grouping)
+
+    lines = [f"📊 *Expenses {start} → {end}* by {grouping}\n"]
+    if groups:
+        rows = [f"{_report_label(grouping, label)[:16]:<16} {to_decimal(total):>12,.2f} {count:>5}"
+                for label, total, count in groups]
+        if len(rows) > REPORT_MAX_LINES:
+            hidden = len(rows) - REPORT_MAX_LINES
+            rows = rows[:REPORT_MAX_LINES] + [f"… {hidden} more, try a coarser grouping"]
+        lines.append("```\n" + "\n".join(rows) + "\n```")
+    else:
+        lines.append("No expenses found.")
+    lines.append(f"💸 Expenses: ₹{to_decimal(expenses.total()):,.2f} ({expenses.transaction_count()} transactions)")
+    lines.append(f"💰 Income: ₹{to_decimal(income):,.2f}")
+    lines.append(f"🧮 Net: ₹{to_decimal(income - expenses.total()):,.2f}")
+
+    buttons = [InlineKeyboardButton(g.title(), callback_data=_report_callback_data(start, end, g))
+               for g in REPORT_GROUPINGS if g != grouping]
+    return "\n".join(lines), InlineKeyboardMarkup([buttons, _chart_buttons(start, end)])
+
+# /report [from] [to] [by day|week|month|category]; without dates it offers presets
+async def report_command(update: Update, context: CallbackContext):
+    args = [a.lower() for a in context.args or []]
+    if not args:
+        buttons = [[InlineKeyboardButton(name, callback_data=_report_callback_data(start, end, 'category'))]
+                   for name, start, end in _report_presets(datetime.now().date())]
+        await update.message.reply_text(
+            "📊 Pick a period, or use /report <from> <to> [by day|week|month|category]",
+            reply_markup=InlineKeyboardMarkup(buttons)
+        )
+        return
+
+    grouping = 'category'
+    if args[-1] in REPORT_GROUPINGS:
+        grouping = args.pop()
+        if args and args[-1] == 'by':
+            args.pop()
+    try:
+        start, end = _parse_date_range(args)
+    except ValueError:
+        await update.message.reply_text(
+            "Usage: /report <from> <to> [by day|week|month|category]\n"
+            "Dates are YYYY-MM-DD, e.g. /report 2025-01-01 2025-12-31 by month"
+        )
+        return
+
+    text, reply_markup = await _custom_report(start, end, grouping)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+
+# Preset and regrouping buttons on custom reports
+async def report_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        _, start, end, grouping = query.data.split("|")
+        start = datetime.strptime(start, PAGE_DATE_FORMAT).date()
+        end = datetime.strptime(end, PAGE_DATE_FORMAT).date()
+    except ValueError:
+        grouping = None
+    if grouping not in REPORT_GROUPINGS:
+        await query.edit_message_text("❌ Invalid selection.")
+        return
+
+    text, reply_markup = await _custom_report(start, end, grouping)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+
+# Chart replies for summaries and reports: chart|<c or t>|<start>|<end>.
+# Rendering happens in charts.py's process pool; an identical chart is served
+# from its cache, by Telegram file_id once it has been uploaded.
+CHART_KINDS = {'c': 'category', 't': 'trend'}
+
+def _chart_buttons(start, end):
+    period = f"{start.strftime(PAGE_DATE_FORMAT)}|{end.strftime(PAGE_DATE_FORMAT)}"
+    return [
+        InlineKeyboardButton("🥧 Categories chart", callback_data=f"chart|c|{period}"),
+        InlineKeyboardButton("📈 Daily trend", callback_data=f"chart|t|{period}"),
+    ]
+
+async def chart_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        _, kind, start, end = query.data.split("|")
+        start = datetime.strptime(start, PAGE_DATE_FORMAT).date()
+        end = datetime.strptime(end, PAGE_DATE_FORMAT).date()
+    except ValueError:
+        kind = None
+    if kind not in CHART_KINDS:
+        await query.message.reply_text("❌ Invalid selection.")
+        return
+
+    expenses = (await run_db(load_ledger, start, end)).filter(transaction_type='expense')
+    if kind == 'c':
+        groups = expenses.group_by('category')
+        labels = [label for label, _, _ in groups]
+        values = [to_decimal(total) for _, total, _ in groups]
+        title = f"Expenses by category, {start} to {end}"
+    else:
+        by_day = {label: total for label, total, _ in expenses.group_by('day')}
+        labels = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        values = [to_decimal(by_day.get(day, 0)) for day in labels]
+        labels = [day.isoformat() for day in labels]
+        title = f"Daily expenses, {start} to {end}"
+
+    if not expenses.transaction_count():
+        await query.message.reply_text(f"No expenses found between {start} and {end}.")
+        return
+
+    key, photo = await chart_renderer.get(CHART_KINDS[kind], title, labels, values)
+    message = await query.message.reply_photo(photo=photo, caption=title)
+    if isinstance(photo, bytes) and message.photo:
+        chart_renderer.remember_upload(key, message.photo[-1].file_id)
 
 # Show summary for Transactions
 
@@ -271,29 +661,24 @@ async def summary_callback(update: Update, context: CallbackContext):
         await query.edit_message_text("❌ Invalid selection.")
         return
 
-    # Retrieve transactions within the selected period
-    records = get_transactions_by_period(start_date, end_date)
+    # Per-category totals are summed by the database as exact Decimals. Only
+    # expenses are counted: income (CSV credits, "+5000 salary") is not spending.
+    category_totals, total_expense = await get_category_totals_async(start_date, end_date, 'expense')
 
-    if not records:
+    if not category_totals:
         await query.edit_message_text(f"{title}\n\nNo transactions found.")
         return
 
-    # Aggregate expenses by category
-    category_totals = defaultdict(float)
-    total_expense = 0.0
-    for record in records:
-        amount, _, category, _, _, _ = record  # Adjust indices based on your record structure
-        amount = float(amount)
-        category_totals[category] += amount
-        total_expense += amount
-
     # Format the summary message
     summary_lines = [f"{title}\n"]
-    for category, amount in category_totals.items():
+    for category, amount in category_totals:
         summary_lines.append(f"• {category}: ₹{amount:.2f}")
     summary_lines.append(f"\n💰 Total: ₹{total_expense:.2f}")
 
-    await query.edit_message_text("\n".join(summary_lines))
+    await query.edit_message_text(
+        "\n".join(summary_lines),
+        reply_markup=InlineKeyboardMarkup([_chart_buttons(start_date, end_date)])
+    )
 
 
 
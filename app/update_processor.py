@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+from telegram.ext import BaseUpdateProcessor
+
+# Max updates handled at the same time across all chats
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '32'))
+
+
+# Update processor that runs updates from different chats concurrently while
+# keeping updates from the same chat (or user, for updates without a chat)
+# strictly in arrival order. ConversationHandler state transitions such as
+# AMOUNT -> CATEGORY -> DESCRIPTION therefore never race, while one user's
+# slow report no longer delays everyone else.
+#
+# The per-chat lock is taken before a concurrency slot, so a chat with a
+# backlog holds at most one slot instead of filling the limit by itself.
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates=MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = {}  # key -> [asyncio.Lock, number of updates holding or waiting]
+
+    @staticmethod
+    def ordering_key(update):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return ('chat', chat.id)
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        return None
+
+    @property
+    def active_chats(self):
+        return len(self._chat_locks)
+
+    async def process_update(self, update, coroutine):
+        key = self.ordering_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,97 @@
+import logging
+import os
+import secrets
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Webhook settings
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')                     # Public https URL Telegram posts updates to
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')               # Checked against X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+# Test mode: no setWebhook call, Bot API calls are answered by FakeBotRequest,
+# and POSTed fake updates drive the handlers. Sent messages are listed at /test/sent.
+WEBHOOK_TEST_MODE = os.getenv('WEBHOOK_TEST_MODE', '0').lower() in ('1', 'true', 'yes')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+# Function to build the FastAPI app that feeds webhook updates into `application`.
+# Updates are only queued here; the Application's own update fetcher processes
+# them concurrently, so the HTTP reply to Telegram never waits for a handler.
+def create_webhook_app(application, fake_bot_api=None):
+    @asynccontextmanager
+    async def lifespan(app):
+        if not WEBHOOK_TEST_MODE:
+            if not WEBHOOK_URL:
+                raise RuntimeError("WEBHOOK_URL must be set in webhook mode")
+            if not WEBHOOK_SECRET:
+                # Without it anyone who finds the URL could post fake updates
+                raise RuntimeError("WEBHOOK_SECRET must be set in webhook mode")
+        await application.initialize()
+        if not WEBHOOK_TEST_MODE:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        logger.info("Webhook listening on %s (test mode: %s)", WEBHOOK_PATH, WEBHOOK_TEST_MODE)
+        try:
+            yield
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.post(WEBHOOK_PATH)
+    async def telegram_webhook(request: Request):
+        if WEBHOOK_SECRET:
+            if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ''), WEBHOOK_SECRET):
+                raise HTTPException(status_code=403, detail="Invalid secret token")
+        elif not WEBHOOK_TEST_MODE:
+            raise HTTPException(status_code=403, detail="Webhook secret not configured")
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise ValueError("Update must be a JSON object")
+            update = Update.de_json(data, application.bot)
+            if update is None:  # de_json returns None for an empty object
+                raise ValueError("Empty update")
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid update") from None
+        await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    @app.get('/healthz')
+    async def healthz():
+        return {'status': 'ok', 'update_queue': application.update_queue.qsize()}
+
+    if fake_bot_api is not None:
+        @app.get('/test/sent')
+        async def sent_messages():
+            return fake_bot_api.calls
+
+    return app
+
+# Function to serve `application` over HTTP until interrupted
+def run_webhook(application, fake_bot_api=None):
+    uvicorn.run(
+        create_webhook_app(application, fake_bot_api),
+        host=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        log_level='info',
+    )
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app modules import each other by bare name (they are run from app/),
+# so make them importable as top-level modules for the benchmarks.
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
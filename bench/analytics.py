@@ -0,0 +1,96 @@
+import argparse
+import json
+import statistics
+import time
+from collections import defaultdict
+
+import bench  # noqa: F401  (puts app/ on sys.path)
+from analytics import Ledger, to_decimal
+from bench.generator import generate_ledger
+
+# Aggregation benchmark: the old summary_callback loop (float(amount) per
+# row into a defaultdict) against analytics.Ledger at the same row count.
+# No database is involved; both sides start from rows already in memory.
+#
+#   python -m bench.analytics --rows 1000000
+
+
+# The per-row loop summary_callback used before the daily_totals rollup
+def legacy_category_summary(records):
+    category_totals = defaultdict(float)
+    total_expense = 0.0
+    for record in records:
+        amount, _, category, _, _, _ = record
+        amount = float(amount)
+        category_totals[category] += amount
+        total_expense += amount
+    return category_totals, total_expense
+
+
+def _median_ms(func, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the legacy summary loop with analytics.Ledger")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='Optional JSON results file')
+    args = parser.parse_args(argv)
+
+    print(f"Generating {args.rows} rows...")
+    generated = list(generate_ledger(args.rows, users=args.users, months=args.months))
+    # transactions_by_period rows for the loop, get_period_columns rows for the Ledger
+    records = [(amount, t, category, user, ts, desc) for amount, t, category, desc, user, ts in generated]
+    columns = [(int(amount * 100), 1, t, category, user, ts.date()) for amount, t, category, _, user, ts in generated]
+    del generated
+
+    results = {'rows': len(records)}
+    results['legacy_loop_ms'], (legacy_totals, legacy_total) = _median_ms(
+        lambda: legacy_category_summary(records), args.repeat)
+    results['ledger_build_ms'], ledger = _median_ms(lambda: Ledger.from_rows(columns), args.repeat)
+    for key in ('category', 'user', 'day', 'week', 'month'):
+        results[f'group_by_{key}_ms'], groups = _median_ms(lambda: ledger.group_by(key), args.repeat)
+        if key == 'category':
+            by_category = groups
+    results['running_totals_day_ms'], _ = _median_ms(lambda: ledger.running_totals('day'), args.repeat)
+
+    # What load_ledger() does by default: build from daily_totals rows
+    rollup = defaultdict(lambda: [0, 0])
+    for cents, count, t, category, user, day in columns:
+        slot = rollup[(t, category, user, day)]
+        slot[0] += cents
+        slot[1] += count
+    rollup_rows = [(cents, count, t, category, user, day) for (t, category, user, day), (cents, count) in rollup.items()]
+    results['rollup_rows'] = len(rollup_rows)
+    results['rollup_build_and_group_ms'], rollup_groups = _median_ms(
+        lambda: Ledger.from_rows(rollup_rows).group_by('category'), args.repeat)
+    assert rollup_groups == by_category
+
+    # Exactness: the float loop drifts from the exact Decimal sum
+    exact_total = to_decimal(ledger.total())
+    results['legacy_total'] = f"{legacy_total:.6f}"
+    results['exact_total'] = str(exact_total)
+    results['legacy_error'] = f"{abs(legacy_total - float(exact_total)):.6f}"
+    assert {label for label, _, _ in by_category} == set(legacy_totals)
+
+    for name, value in results.items():
+        print(f"{name:<24} {value:>14.1f}" if isinstance(value, float) else f"{name:<24} {value:>14}")
+    print(f"speedup vs loop: group by on a built Ledger {results['legacy_loop_ms'] / results['group_by_category_ms']:.1f}x, "
+          f"from rollup rows {results['legacy_loop_ms'] / results['rollup_build_and_group_ms']:.1f}x, "
+          f"from raw rows {results['legacy_loop_ms'] / (results['ledger_build_ms'] + results['group_by_category_ms']):.1f}x")
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
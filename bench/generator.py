@@ -0,0 +1,94 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Category mix for synthetic expenses: a few categories get most rows,
+# as in real ledgers (Food and Groceries dominate, Medical is rare).
+EXPENSE_WEIGHTS = {
+    'Food': 30,
+    'Groceries': 20,
+    'Travel': 12,
+    'Shopping': 10,
+    'Utilities': 8,
+    'Entertainment': 8,
+    'Other': 6,
+    'Investments': 3,
+    'Medical': 3,
+}
+
+# Typical amount (median, spread) per category, drawn from a log-normal
+EXPENSE_AMOUNTS = {
+    'Food': (250, 0.6),
+    'Groceries': (900, 0.5),
+    'Travel': (400, 0.9),
+    'Shopping': (1500, 0.8),
+    'Utilities': (1200, 0.4),
+    'Entertainment': (600, 0.6),
+    'Other': (300, 1.0),
+    'Investments': (5000, 0.7),
+    'Medical': (800, 0.9),
+}
+
+DESCRIPTIONS = {
+    'Food': ['lunch', 'dinner with team', 'coffee', 'snacks', 'breakfast'],
+    'Groceries': ['weekly groceries', 'vegetables', 'milk and bread'],
+    'Travel': ['cab to office', 'metro card', 'train tickets', 'fuel'],
+    'Shopping': ['clothes', 'shoes', 'electronics', 'gift'],
+    'Utilities': ['electricity bill', 'internet', 'phone recharge', 'water bill'],
+    'Entertainment': ['movie', 'concert', 'streaming subscription'],
+    'Other': ['misc', 'donation', 'repairs'],
+    'Investments': ['SIP', 'mutual fund', 'stocks'],
+    'Medical': ['pharmacy', 'doctor visit', 'lab test'],
+}
+
+
+# Function to generate a synthetic ledger of about `rows` transactions for
+# `users` users spread over `months` months ending at `end`.
+# Yields (amount, type, category, description, user, timestamp) tuples in
+# timestamp order, the row format save_many_to_db takes. Every user also gets
+# a Salary income row on the 1st of each month. Seeded, so runs are repeatable.
+def generate_ledger(rows, users=50, months=12, end=None, seed=42):
+    rng = random.Random(seed)
+    end = (end or datetime.now()).replace(microsecond=0)
+    start = end - timedelta(days=30 * months)
+    span = (end - start).total_seconds()
+
+    usernames = [f"user{i:04d}" for i in range(users)]
+    # Some users log far more than others
+    user_weights = [1 / (rank + 1) ** 0.8 for rank in range(users)]
+    categories = list(EXPENSE_WEIGHTS)
+    category_weights = list(EXPENSE_WEIGHTS.values())
+
+    salary_days = []
+    day = start.replace(day=1, hour=9, minute=0, second=0) + timedelta(days=32)
+    while day <= end:
+        salary_days.append(day.replace(day=1))
+        day = day.replace(day=1) + timedelta(days=32)
+    salary_rows = len(salary_days) * users
+    expense_rows = max(rows - salary_rows, 0)
+
+    offsets = sorted(rng.random() * span for _ in range(expense_rows))
+    salaries = iter(sorted((when, user) for when in salary_days for user in usernames))
+    next_salary = next(salaries, None)
+
+    for offset in offsets:
+        timestamp = start + timedelta(seconds=int(offset))
+        while next_salary is not None and next_salary[0] <= timestamp:
+            yield (Decimal('85000.00'), 'income', 'Salary', 'monthly salary', next_salary[1], next_salary[0])
+            next_salary = next(salaries, None)
+
+        category = rng.choices(categories, category_weights)[0]
+        median, spread = EXPENSE_AMOUNTS[category]
+        amount = Decimal(str(round(rng.lognormvariate(0, spread) * median, 2)))
+        yield (
+            amount,
+            'expense',
+            category,
+            rng.choice(DESCRIPTIONS[category]),
+            rng.choices(usernames, user_weights)[0],
+            timestamp,
+        )
+
+    while next_salary is not None:
+        yield (Decimal('85000.00'), 'income', 'Salary', 'monthly salary', next_salary[1], next_salary[0])
+        next_salary = next(salaries, None)
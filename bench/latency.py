@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import bench  # noqa: F401  (puts app/ on sys.path)
+from telegram import Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+from update_processor import PerChatUpdateProcessor
+
+# Mixed-load latency measurement for update processing.
+# Simulates many users typing (fast handlers) while a few request slow
+# reports, feeds the updates through an update processor the way the
+# Application's update fetcher does, and reports latency percentiles from
+# arrival to handler completion. Also checks that every chat saw its
+# updates in arrival order.
+#
+#   python -m bench.latency --users 200 --updates 4000 --slow-ratio 0.02
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def _make_update(update_id, chat_id):
+    user = User(id=chat_id, first_name=f'user{chat_id}', is_bot=False)
+    chat = Chat(id=chat_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=None, chat=chat, from_user=user, text='250')
+    return Update(update_id=update_id, message=message)
+
+async def _run(processor, workload, arrival_gap):
+    latencies = {'fast': [], 'slow': []}
+    seen = {}
+    out_of_order = 0
+
+    async def handler(update, kind, duration, arrived):
+        nonlocal out_of_order
+        chat_id = update.effective_chat.id
+        if seen.get(chat_id, -1) > update.update_id:
+            out_of_order += 1
+        seen[chat_id] = update.update_id
+        await asyncio.sleep(duration)  # Handlers await I/O (DB executor, Bot API)
+        latencies[kind].append(time.perf_counter() - arrived)
+
+    # Updates arrive on a fixed schedule; the consumer below plays the part
+    # of the Application's update fetcher.
+    queue = asyncio.Queue()
+
+    async def produce():
+        for update_id, chat_id, kind, duration in workload:
+            await queue.put((_make_update(update_id, chat_id), kind, duration, time.perf_counter()))
+            await asyncio.sleep(arrival_gap)
+        await queue.put(None)
+
+    tasks = []
+    async with processor:
+        producer = asyncio.create_task(produce())
+        while (item := await queue.get()) is not None:
+            update, kind, duration, arrived = item
+            coroutine = processor.process_update(update, handler(update, kind, duration, arrived))
+            if processor.max_concurrent_updates > 1:
+                tasks.append(asyncio.create_task(coroutine))
+            else:
+                await coroutine
+        await producer
+        await asyncio.gather(*tasks)
+
+    all_latencies = latencies['fast'] + latencies['slow']
+    return {
+        'updates': len(all_latencies),
+        'p50_ms': statistics.median(all_latencies) * 1000,
+        'p99_ms': _percentile(all_latencies, 99) * 1000,
+        'fast_p99_ms': _percentile(latencies['fast'], 99) * 1000,
+        'slow_p99_ms': _percentile(latencies['slow'], 99) * 1000 if latencies['slow'] else None,
+        'out_of_order': out_of_order,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure update latency under mixed load")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--slow-ratio', type=float, default=0.02, help='Share of updates that are slow reports')
+    parser.add_argument('--fast-ms', type=float, default=3)
+    parser.add_argument('--slow-ms', type=float, default=400)
+    parser.add_argument('--arrival-ms', type=float, default=1, help='Gap between incoming updates')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--out', help='Optional JSON results file')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    workload = []
+    for update_id in range(args.updates):
+        slow = rng.random() < args.slow_ratio
+        workload.append((
+            update_id,
+            rng.randrange(args.users) + 1,
+            'slow' if slow else 'fast',
+            (args.slow_ms if slow else args.fast_ms) / 1000,
+        ))
+
+    results = {}
+    for name, processor in (
+        ('sequential', SimpleUpdateProcessor(1)),
+        ('per_chat_concurrent', PerChatUpdateProcessor(args.concurrency)),
+    ):
+        results[name] = asyncio.run(_run(processor, workload, args.arrival_ms / 1000))
+        r = results[name]
+        print(f"{name:<22} p50 {r['p50_ms']:9.1f} ms  p99 {r['p99_ms']:9.1f} ms  "
+              f"fast p99 {r['fast_p99_ms']:9.1f} ms  out of order {r['out_of_order']}")
+
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump({'args': vars(args), 'results': results}, fp, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import time
+
+import bench  # noqa: F401  (puts app/ on sys.path)
+from fake_bot_api import FakeBotRequest
+from outbound import BULK, FloodAwareRateLimiter
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+# Burst test for the outbound send layer against the local fake Bot API with
+# Telegram-like flood limits (fake_bot_api.limit_rates). The same burst of
+# interactive replies, bulk digests and repeated progress edits is sent with
+# and without FloodAwareRateLimiter; the report shows 429s returned by the
+# fake API, calls that failed for the caller, latency per priority, edits
+# coalesced and whether every chat received its messages in order.
+#
+#   python -m bench.outbound --chats 40 --replies 3 --digests 150 --edits 30
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))] if samples else None
+
+
+async def run(args, limited):
+    fake = FakeBotRequest(max_calls=100000)
+    fake.limit_rates(per_chat=args.chat_limit, overall=args.global_limit, retry_after=1)
+    # The fake counts over a sliding window, which is stricter than Telegram,
+    # so the limiter runs without bursts and just under the fake's limits
+    limiter = FloodAwareRateLimiter(
+        global_rate=args.global_limit - 2, global_burst=1, chat_rate=args.chat_limit * 0.95, chat_burst=1,
+    ) if limited else None
+    bot = ExtBot('123456:bench-token', request=fake, get_updates_request=fake, rate_limiter=limiter)
+    await bot.initialize()
+
+    latencies = {'interactive': [], 'bulk': []}
+    failed = 0
+
+    async def send(kind, chat_id, text, **kwargs):
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            if kind == 'edit':
+                await bot.edit_message_text(text, chat_id=chat_id, message_id=1, **kwargs)
+            else:
+                await bot.send_message(chat_id, text, **kwargs)
+        except RetryAfter:
+            failed += 1
+            return
+        latencies['bulk' if 'rate_limit_args' in kwargs else 'interactive'].append(time.perf_counter() - started)
+
+    bulk = {'rate_limit_args': {'priority': BULK}} if limited else {}
+    started = time.perf_counter()
+    tasks = []
+    # Digests are queued first; interactive replies arrive while they drain
+    for chat_id in range(10_000, 10_000 + args.digests):
+        tasks.append(asyncio.create_task(send('send', chat_id, 'digest', **bulk)))
+    await asyncio.sleep(0)
+    for n in range(args.replies):
+        for chat_id in range(1, args.chats + 1):
+            tasks.append(asyncio.create_task(send('send', chat_id, f'reply {n}')))
+    for n in range(args.edits):
+        tasks.append(asyncio.create_task(send('edit', 999, f'progress {n}')))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+
+    delivered = {}
+    for call in fake.calls:
+        chat_id = call['params'].get('chat_id')
+        if call['method'] == 'sendMessage' and chat_id is not None and chat_id < 10_000:
+            delivered.setdefault(chat_id, []).append(call['params']['text'])
+    in_order = all(texts == sorted(texts, key=lambda t: int(t.split()[1])) for texts in delivered.values())
+    edits_sent = sum(1 for call in fake.calls if call['method'] == 'editMessageText')
+
+    return {
+        'rate_limiter': limited,
+        'elapsed_s': round(elapsed, 2),
+        'flood_429s': fake.flood_errors,
+        'failed_calls': failed,
+        'interactive_p50_ms': round(_percentile(latencies['interactive'], 50) * 1000, 1),
+        'interactive_p99_ms': round(_percentile(latencies['interactive'], 99) * 1000, 1),
+        'bulk_p50_ms': round((_percentile(latencies['bulk'], 50) or 0) * 1000, 1),
+        'edit_calls_sent': edits_sent,
+        'chats_in_order': in_order,
+        'last_edit_text': next((c['params']['text'] for c in reversed(fake.calls)
+                                if c['method'] == 'editMessageText'), None),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Burst test for the flood-aware outbound rate limiter")
+    parser.add_argument('--chats', type=int, default=40)
+    parser.add_argument('--replies', type=int, default=3, help='Interactive replies per chat')
+    parser.add_argument('--digests', type=int, default=150, help='Bulk messages, one per chat')
+    parser.add_argument('--edits', type=int, default=30, help='Edits of one progress message')
+    parser.add_argument('--chat-limit', type=int, default=1, help='Fake API messages per chat per second')
+    parser.add_argument('--global-limit', type=int, default=30, help='Fake API messages per second')
+    parser.add_argument('--out', help='Optional JSON results file')
+    args = parser.parse_args(argv)
+
+    results = [asyncio.run(run(args, limited)) for limited in (False, True)]
+    for result in results:
+        print(json.dumps(result))
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import bench  # noqa: F401  (puts app/ on sys.path)
+import db
+from storage import MariaDBStorage, SQLiteStorage
+from bench.generator import generate_ledger
+
+LOAD_BATCH_SIZE = 5000
+
+# Usage (from the repository root):
+#   python -m bench.run --sizes 10000 100000 1000000 --out bench_results.json
+#   python -m bench.run --backend mariadb --sizes 10000   # uses a throwaway database
+
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'min_ms': samples[0] * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+def _time(func, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+def _fresh_storage(args, size):
+    if args.backend == 'sqlite':
+        path = os.path.join(args.workdir, f'bench_{size}.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return SQLiteStorage(path)
+
+    # MariaDB: recreate a dedicated database so production data is never touched
+    import mysql.connector
+    admin = mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'mariadb'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD'),
+    )
+    cursor = admin.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{args.mariadb_database}`")
+    cursor.execute(f"CREATE DATABASE `{args.mariadb_database}`")
+    cursor.close()
+    admin.close()
+    return MariaDBStorage(database=args.mariadb_database)
+
+def _load(rows, users, months, end):
+    ledger = generate_ledger(rows, users=users, months=months, end=end)
+    started = time.perf_counter()
+    loaded = 0
+    while True:
+        batch = list(itertools.islice(ledger, LOAD_BATCH_SIZE))
+        if not batch:
+            break
+        db.save_many_to_db(batch)
+        loaded += len(batch)
+    return loaded, time.perf_counter() - started
+
+def run_size(args, size):
+    from telegram_bot_v1_4 import format_transactions_table
+
+    storage = _fresh_storage(args, size)
+    storage.create_schema()
+    db.use_storage(storage)
+
+    end = datetime.now().replace(microsecond=0)
+    today = end.date()
+    loaded, load_seconds = _load(size, args.users, args.months, end)
+
+    periods = {
+        'today': (today, today),
+        'week': (today - timedelta(days=today.weekday()), today),
+        'month': (today.replace(day=1), today),
+        'year': (today - timedelta(days=365), today),
+    }
+
+    results = []
+
+    def record(name, samples, **extra):
+        entry = {'rows': loaded, 'name': name}
+        entry.update(_stats(samples))
+        entry.update(extra)
+        results.append(entry)
+        print(f"{loaded:>9} rows  {name:<40} median {entry['median_ms']:9.3f} ms  p95 {entry['p95_ms']:9.3f} ms")
+
+    # Single-row saves, one transaction each (the /start conversation path)
+    samples = []
+    for i in range(args.saves):
+        started = time.perf_counter()
+        db.save_data_to_db('123.45', 'expense', 'Food', 'bench save', f'user{i % args.users:04d}', end)
+        samples.append(time.perf_counter() - started)
+    record('save_data_to_db', samples)
+
+    for period, (start_date, end_date) in periods.items():
+        def fetch():
+            db.report_cache.clear()
+            return db.get_transactions_by_period(start_date, end_date)
+        samples, records = _time(fetch, args.repeat)
+        record(f'get_transactions_by_period[{period}]', samples, result_rows=len(records))
+
+        samples, _ = _time(lambda: format_transactions_table(records), args.repeat)
+        record(f'format_transactions_table[{period}]', samples, result_rows=len(records))
+
+        def summarise():
+            db.report_cache.clear()
+            return db.get_category_totals(start_date, end_date)
+        samples, _ = _time(summarise, args.repeat)
+        record(f'get_category_totals[{period}]', samples)
+
+        samples, _ = _time(lambda: db.get_category_totals(start_date, end_date), args.repeat)
+        record(f'get_category_totals[{period}] (cached)', samples)
+
+    db.close_storage()
+    return {'rows': loaded, 'load_seconds': load_seconds, 'results': results}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot's storage and report paths")
+    parser.add_argument('--backend', choices=['sqlite', 'mariadb'], default='sqlite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per read benchmark')
+    parser.add_argument('--saves', type=int, default=200, help='Single-row saves to time')
+    parser.add_argument('--workdir', default=tempfile.gettempdir(), help='Where SQLite benchmark databases go')
+    parser.add_argument('--mariadb-database', default='finance_tracker_bench',
+                        help='Database dropped and recreated for MariaDB runs')
+    parser.add_argument('--out', default='bench_results.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    runs = [run_size(args, size) for size in args.sizes]
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'backend': args.backend,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'users': args.users,
+        'months': args.months,
+        'runs': runs,
+    }
+    with open(args.out, 'w') as fp:
+        json.dump(report, fp, indent=2)
+    print(f"Results written to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,204 @@
-from flask import Flask, request, redirect, render_template
-import sqlite3
-
-app = Flask(__name__)
-
-def validate_user(username, password):
-    conn = sqlite3.connect('user_database.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
-    user = cursor.fetchone()
-    conn.close()
-    return user is not None
-
-@app.route('/login', methods=['POST'])
-def login():
-    username = request.form['username']
-    password = request.form['password']
-    if validate_user(username, password):
-        return redirect('/home')
-    else:
-        return "Invalid credentials, please try again."
-
-@app.route('/home')
-def home():
-    return "Welcome to the Home Page!"
+import hashlib
+import logging
+import os
+import secrets
+import sys
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.staticfiles import StaticFiles
+
+WEB_DIR = os.path.dirname(os.path.abspath(__file__))
+# The bot's modules live in app/ and import each other by bare name
+sys.path.insert(0, os.path.join(os.path.dirname(WEB_DIR), 'app'))
+
+from analytics import GROUP_KEYS, Ledger, to_decimal  # noqa: E402
+from db import (  # noqa: E402
+    bootstrap_schema, close_storage, get_data_version, get_period_columns, get_transactions_page, run_db
+)
+from report_cache import cached  # noqa: E402
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Web settings
+WEB_HOST = os.getenv('WEB_HOST', '127.0.0.1')
+WEB_PORT = int(os.getenv('WEB_PORT', '8000'))
+# Required as "Authorization: Bearer <token>" on /api when set
+WEB_API_TOKEN = os.getenv('WEB_API_TOKEN')
+# Seconds a browser may reuse a response without asking; 0 = revalidate every
+# time (cheap: an unchanged response is a 304 after one MAX(id) lookup)
+WEB_CACHE_MAX_AGE = int(os.getenv('WEB_CACHE_MAX_AGE', '0'))
+WEB_PAGE_SIZE = int(os.getenv('WEB_PAGE_SIZE', '50'))
+WEB_MAX_PAGE_SIZE = 500
+
+CACHE_CONTROL = f'private, max-age={WEB_CACHE_MAX_AGE}' if WEB_CACHE_MAX_AGE else 'private, no-cache'
+
+
+# Function to check the bearer token, if one is configured
+async def require_token(request: Request):
+    if WEB_API_TOKEN and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {WEB_API_TOKEN}'):
+        raise HTTPException(status_code=401, detail="Invalid or missing token", headers={'WWW-Authenticate': 'Bearer'})
+
+
+# Function to default a period to the current month, like the bot's commands
+def _period(start, end):
+    today = date.today()
+    start, end = start or today.replace(day=1), end or today
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+def _cursor(row):
+    return f"{row[5].isoformat()}_{row[0]}"
+
+
+def _parse_cursor(text):
+    timestamp, _, row_id = text.rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {text!r}") from None
+
+
+# Function to answer with `build(version)` as JSON, or with a 304 if the
+# client's ETag still matches. The ETag covers the data version and the
+# resolved parameters (`variant`): a request without dates means "this month",
+# which changes with the calendar, not with the data. The version is read
+# before the data, so a write in between can only make the body newer than
+# its ETag, never older.
+async def _conditional(request, variant, build):
+    version = await run_db(get_data_version)
+    digest = hashlib.sha1(repr(variant).encode()).hexdigest()[:16]
+    etag = f'"{version}-{digest}"'
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    client_etags = [t.strip().removeprefix('W/') for t in request.headers.get('If-None-Match', '').split(',')]
+    if etag in client_etags or '*' in client_etags:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(await build(version), headers=headers)
+
+
+# Function to build a summary. The Ledger is cached under the data version,
+# so it is never served after new transactions arrive (this process does not
+# see the bot's writes, which is what normally invalidates the report cache).
+def _summary(start, end, user, by, transaction_type, version):
+    ledger = cached(
+        (user, start, end, f'web:ledger:{version}'),
+        lambda: Ledger.from_rows(get_period_columns(start, end, user, True))
+    )
+    expenses = ledger.filter(transaction_type='expense')
+    income = ledger.filter(transaction_type='income')
+    selected = expenses if transaction_type == 'expense' else income
+    label = lambda value: value.isoformat() if isinstance(value, date) else value
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'user': user,
+        'by': by,
+        'type': transaction_type,
+        'expenses': str(to_decimal(expenses.total())),
+        'income': str(to_decimal(income.total())),
+        'net': str(to_decimal(income.total() - expenses.total())),
+        'transactions': ledger.transaction_count(),
+        'groups': [
+            {'label': label(key), 'total': str(to_decimal(total)), 'count': count}
+            for key, total, count in selected.group_by(by)
+        ],
+    }
+
+
+def _transactions_page(start, end, user, after, before, limit):
+    rows, has_more = get_transactions_page(start, end, after, before, limit, user)
+    items = [
+        {
+            'id': row_id,
+            'timestamp': timestamp.isoformat(),
+            'amount': str(amount),  # Exact decimal, not a float
+            'type': transaction_type,
+            'category': category,
+            'user': username,
+            'description': description,
+        }
+        for row_id, amount, transaction_type, category, username, timestamp, description in rows
+    ]
+    # Cursors only point where there is something to fetch
+    going_back = before is not None
+    return {
+        'items': items,
+        'next': _cursor(rows[-1]) if rows and (going_back or has_more) else None,
+        'prev': _cursor(rows[0]) if rows and (has_more if going_back else after is not None) else None,
+    }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await run_db(bootstrap_schema)
+    if not WEB_API_TOKEN:
+        logger.warning("WEB_API_TOKEN is not set; the API is open to anyone who can reach %s", WEB_HOST)
+    try:
+        yield
+    finally:
+        close_storage()
+
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+app.mount('/css', StaticFiles(directory=os.path.join(WEB_DIR, 'css')), name='css')
+app.mount('/images', StaticFiles(directory=os.path.join(WEB_DIR, 'images')), name='images')
+
+
+@app.get('/')
+async def dashboard():
+    return FileResponse(os.path.join(WEB_DIR, 'dashboard.html'))
+
+
+# Sign-in page: stores the API token for the dashboard
+@app.get('/login')
+async def login():
+    return FileResponse(os.path.join(WEB_DIR, 'index.html'))
+
+
+@app.get('/healthz')
+async def healthz():
+    return {'status': 'ok'}
+
+
+# Totals for a period grouped by category, user, type, day, week or month
+@app.get('/api/summary', dependencies=[Depends(require_token)])
+async def summary(request: Request, start: date = None, end: date = None, user: str = None,
+                  by: str = 'category',
+                  transaction_type: str = Query('expense', alias='type', pattern='^(expense|income)$')):
+    if by not in GROUP_KEYS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(GROUP_KEYS)}")
+    start, end = _period(start, end)
+    return await _conditional(
+        request, (start, end, user, by, transaction_type),
+        lambda version: run_db(_summary, start, end, user, by, transaction_type, version)
+    )
+
+
+# Transactions for a period, oldest first, paged with the next/prev cursors
+@app.get('/api/transactions', dependencies=[Depends(require_token)])
+async def transactions(request: Request, start: date = None, end: date = None, user: str = None,
+                       limit: int = Query(WEB_PAGE_SIZE, ge=1, le=WEB_MAX_PAGE_SIZE),
+                       after: str = None, before: str = None):
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either after or before, not both")
+    start, end = _period(start, end)
+    after = _parse_cursor(after) if after else None
+    before = _parse_cursor(before) if before else None
+    return await _conditional(
+        request, (start, end, user, after, before, limit),
+        lambda version: run_db(_transactions_page, start, end, user, after, before, limit)
+    )
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    uvicorn.run(app, host=WEB_HOST, port=WEB_PORT, log_level='info')